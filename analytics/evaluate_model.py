@@ -3,48 +3,56 @@
 Evaluate fraud model performance.
 
 By default this pulls from MySQL (via app.db.get_conn), uses the latest
-FraudScore per txn_id, treats transactions with reason containing
-'Amount z-score high' as TRUE FRAUD (1), and uses the model's 'flagged'
-as the prediction (1/0). You can also override the threshold to rebuild
-predictions from anomaly_score.
+score per txn_id (FraudScoreLatest), treats transactions with reason
+containing 'Amount z-score high' as TRUE FRAUD (1), and uses the model's
+'flagged' as the prediction (1/0). You can also override the threshold to
+rebuild predictions from anomaly_score, or sweep many thresholds at once.
 
 Outputs:
 - prints metrics to console
 - saves confusion_matrix.csv, metrics.json
 - saves roc.png, pr_curve.png in analytics/exports/
+- with --sweep: saves threshold_sweep.csv, best_threshold.json instead
+- with --no-plots: skips the PNGs (matplotlib is then never imported)
+- with --streaming: reads scores in chunks and derives ROC/PR from per-class
+  score histograms in constant memory (AUCs carry an error bound, see
+  StreamingEvaluator)
 """
 
+from __future__ import annotations
 import argparse
 import json
 from pathlib import Path
-import numpy as np
-import pandas as pd
-from sklearn.metrics import (
-    confusion_matrix, classification_report, roc_curve, auc,
-    precision_recall_curve
-)
-import matplotlib.pyplot as plt
+from typing import TYPE_CHECKING
 
 # our DB connector
 from app.db import get_conn
 
+# numpy / pandas / sklearn / matplotlib are imported where they are used, so
+# `--help` and the paths that don't need them start without loading them
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 EXPORT_DIR = Path("analytics/exports")
 EXPORT_DIR.mkdir(parents=True, exist_ok=True)
 
+HIST_BINS = 10000    # score histogram resolution for --streaming
+CHUNK_ROWS = 50000   # rows fetched per chunk for --streaming
+
+LATEST_SCORES_SQL = """
+    SELECT txn_id, anomaly_score, flagged, reason, scored_at
+    FROM FraudScoreLatest
+    ORDER BY txn_id ASC
+"""
+
 
 def fetch_latest_scores():
-    """Fetch FraudScore and keep the latest row per txn_id."""
-    q = """
-        SELECT score_id, txn_id, anomaly_score, flagged, reason, scored_at
-        FROM FraudScore
-        ORDER BY score_id ASC
-    """
+    """Fetch the latest score per txn_id (maintained by the scoring write path)."""
+    import pandas as pd
     with get_conn() as conn:
-        df = pd.read_sql(q, conn)
+        latest = pd.read_sql(LATEST_SCORES_SQL, conn)
 
-    # keep last (latest) row per txn_id by score_id
-    latest = df.groupby("txn_id", as_index=False).tail(1).reset_index(drop=True)
     # normalize types
     latest["flagged"] = latest["flagged"].astype(int)
     latest["anomaly_score"] = latest["anomaly_score"].astype(float)
@@ -62,10 +70,11 @@ def try_label_from_transaction_flag():
     If you later add Transaction.is_fraud ground truth, we can use it here.
     This function tries to fetch it; if not present, returns None.
     """
+    import pandas as pd
     q = """
-    SELECT fs.txn_id, t.is_fraud
-    FROM FraudScore fs
-    JOIN Transaction t ON t.txn_id = fs.txn_id
+    SELECT l.txn_id, t.is_fraud
+    FROM FraudScoreLatest l
+    JOIN Transaction t ON t.txn_id = l.txn_id
     LIMIT 1
     """
     try:
@@ -78,22 +87,10 @@ def try_label_from_transaction_flag():
     return False
 
 
-def evaluate(latest: pd.DataFrame, y_true: pd.Series, y_pred: pd.Series):
-    """Compute core metrics and plots; return dict with key numbers."""
-    # Confusion matrix
-    cm = confusion_matrix(y_true, y_pred, labels=[0, 1])
+def save_outputs(cm, report, extra):
+    """Write confusion_matrix.csv and metrics.json (extra = AUC figures etc.)."""
+    import pandas as pd
     tn, fp, fn, tp = cm.ravel()
-
-    # Classification report
-    report = classification_report(y_true, y_pred, output_dict=True)
-
-    # ROC/PR using continuous scores
-    scores = latest["anomaly_score"].values
-    fpr, tpr, _ = roc_curve(y_true, scores)
-    roc_auc = auc(fpr, tpr)
-    prec, rec, _ = precision_recall_curve(y_true, scores)
-
-    # Save numeric outputs
     pd.DataFrame(cm, index=["Actual 0", "Actual 1"], columns=["Pred 0", "Pred 1"])\
         .to_csv(EXPORT_DIR / "confusion_matrix.csv", index=True)
     with open(EXPORT_DIR / "metrics.json", "w") as f:
@@ -106,9 +103,13 @@ def evaluate(latest: pd.DataFrame, y_true: pd.Series, y_pred: pd.Series):
             "precision_legit": report["0"]["precision"],
             "recall_legit": report["0"]["recall"],
             "f1_legit": report["0"]["f1-score"],
-            "roc_auc": roc_auc
+            **extra
         }, f, indent=2)
 
+
+def save_plots(fpr, tpr, roc_auc, rec, prec):
+    import matplotlib.pyplot as plt
+
     # ROC plot
     plt.figure(figsize=(6, 5))
     plt.plot(fpr, tpr, label=f"AUC = {roc_auc:.3f}")
@@ -133,6 +134,31 @@ def evaluate(latest: pd.DataFrame, y_true: pd.Series, y_pred: pd.Series):
     plt.savefig(EXPORT_DIR / "pr_curve.png", dpi=160)
     plt.close()
 
+
+def evaluate(latest: pd.DataFrame, y_true: pd.Series, y_pred: pd.Series, plots=True):
+    """Compute core metrics and (optionally) plots; return dict with key numbers."""
+    from sklearn.metrics import (
+        confusion_matrix, classification_report, roc_curve, auc,
+        precision_recall_curve
+    )
+
+    # Confusion matrix
+    cm = confusion_matrix(y_true, y_pred, labels=[0, 1])
+    tn, fp, fn, tp = cm.ravel()
+
+    # Classification report
+    report = classification_report(y_true, y_pred, output_dict=True)
+
+    # ROC/PR using continuous scores
+    scores = latest["anomaly_score"].values
+    fpr, tpr, _ = roc_curve(y_true, scores)
+    roc_auc = auc(fpr, tpr)
+
+    save_outputs(cm, report, {"roc_auc": roc_auc})
+    if plots:
+        prec, rec, _ = precision_recall_curve(y_true, scores)
+        save_plots(fpr, tpr, roc_auc, rec, prec)
+
     return {
         "cm": cm,
         "report": report,
@@ -140,8 +166,205 @@ def evaluate(latest: pd.DataFrame, y_true: pd.Series, y_pred: pd.Series):
     }
 
 
+def iter_latest_scores(ground_truth="reason", keyword="Amount z-score high", chunk=CHUNK_ROWS):
+    """
+    Stream (anomaly_score, flagged, y_true) arrays from FraudScoreLatest,
+    chunk rows at a time, through an unbuffered cursor (no ORDER BY needed).
+    Without a Transaction.is_fraud column, labels come from `reason`, as in
+    the in-memory path.
+    """
+    import pandas as pd
+    if ground_truth == "transaction" and not try_label_from_transaction_flag():
+        ground_truth = "reason"
+    if ground_truth == "transaction":
+        q = """
+            SELECT l.anomaly_score, l.flagged, t.is_fraud
+            FROM FraudScoreLatest l
+            JOIN Transaction t ON t.txn_id = l.txn_id
+        """
+    else:
+        q = "SELECT anomaly_score, flagged, reason FROM FraudScoreLatest"
+    with get_conn() as conn:
+        cur = conn.cursor(buffered=False)
+        cur.execute(q)
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            df = pd.DataFrame.from_records(rows, columns=["anomaly_score", "flagged", "truth"])
+            if ground_truth == "transaction":
+                y_true = df["truth"].astype(int).to_numpy()
+            else:
+                y_true = df["truth"].astype(str).str.contains(keyword, case=False, na=False).astype(int).to_numpy()
+            yield df["anomaly_score"].astype(float).to_numpy(), df["flagged"].astype(int).to_numpy(), y_true
+
+
+def report_from_cm(cm) -> dict:
+    """classification_report(output_dict=True)-shaped summary rebuilt from confusion counts."""
+    import numpy as np
+    tn, fp, fn, tp = (int(v) for v in np.asarray(cm).ravel())
+
+    def prf(hit, false_pos, false_neg):
+        p = hit / (hit + false_pos) if hit + false_pos else 0.0
+        r = hit / (hit + false_neg) if hit + false_neg else 0.0
+        f = 2 * p * r / (p + r) if p + r else 0.0
+        return {"precision": p, "recall": r, "f1-score": f, "support": hit + false_neg}
+
+    total = tn + fp + fn + tp
+    return {
+        "0": prf(tn, fn, fp),
+        "1": prf(tp, fp, fn),
+        "accuracy": (tn + tp) / total if total else 0.0,
+    }
+
+
+class StreamingEvaluator:
+    """
+    Constant-memory evaluation: confusion counts plus a fixed-resolution
+    histogram of anomaly_score per class, folded in chunk by chunk.
+
+    ROC/PR curves come from cumulative histogram counts taken from the top
+    bin down, i.e. one operating point per bin edge. Only rows sharing a bin
+    are out of order, which bounds the error of the approximations:
+
+    - ROC AUC (trapezoid): the pairs of a positive and a negative in the same
+      bin count as half-correct; the exact AUC is within
+      sum_b pos_b * neg_b / (2 * P * N) of the estimate.
+    - Average precision (bin-end precision, as sklearn's step sum): with T, F
+      positives/negatives in the bins above, every positive in bin b has an
+      exact precision between (T + 1) / (T + F + 1 + neg_b) and
+      (T + pos_b) / (T + F + pos_b); the exact AP is within
+      sum_b pos_b * (p_max - p_min) / P of the estimate.
+
+    Both bounds shrink as bins grows and are reported with the metrics.
+    Scores are expected in [0, 1] (FraudScore.anomaly_score); values outside
+    are clamped into the end bins.
+    """
+
+    def __init__(self, bins=HIST_BINS, threshold=None):
+        import numpy as np
+        self.bins = bins
+        self.threshold = threshold
+        self.hist = np.zeros((2, bins), dtype=np.int64)  # [label, score bin]
+        self.cm = np.zeros(4, dtype=np.int64)            # tn, fp, fn, tp
+        self.rows = 0
+
+    def update(self, scores, y_true, y_pred):
+        import numpy as np
+        scores = np.nan_to_num(np.asarray(scores, dtype=float))
+        y = np.asarray(y_true, dtype=np.int64)
+        if self.threshold is not None:
+            y_pred = scores >= self.threshold
+        y_pred = np.asarray(y_pred, dtype=np.int64)
+        b = np.clip((scores * self.bins).astype(np.int64), 0, self.bins - 1)
+        self.hist += np.bincount(y * self.bins + b, minlength=2 * self.bins).reshape(2, self.bins)
+        self.cm += np.bincount(y * 2 + y_pred, minlength=4)
+        self.rows += len(y)
+
+    def curves(self):
+        """ROC/PR points, AUC, AP and their error bounds from the histograms."""
+        import numpy as np
+        neg_b, pos_b = self.hist[0][::-1], self.hist[1][::-1]  # highest scores first
+        tp = np.concatenate([[0], np.cumsum(pos_b)])
+        fp = np.concatenate([[0], np.cumsum(neg_b)])
+        P, N = int(tp[-1]), int(fp[-1])
+        tpr = tp / max(P, 1)
+        fpr = fp / max(N, 1)
+        roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+        roc_err = float(np.sum(pos_b * neg_b) / (2 * max(P, 1) * max(N, 1)))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            prec = np.where(tp + fp > 0, tp / (tp + fp), 1.0)
+            above_t, above_f = tp[:-1], fp[:-1]
+            p_min = (above_t + 1) / (above_t + above_f + 1 + neg_b)
+            p_max = (above_t + pos_b) / (above_t + above_f + pos_b)
+        ap = float(np.sum(np.diff(tpr) * prec[1:]))
+        ap_err = float(np.sum(np.where(pos_b > 0, pos_b * (p_max - p_min), 0.0)) / max(P, 1))
+        return {
+            "fpr": fpr, "tpr": tpr, "precision": prec, "recall": tpr,
+            "roc_auc": roc_auc, "roc_auc_error_bound": roc_err,
+            "average_precision": ap, "average_precision_error_bound": ap_err,
+        }
+
+
+def evaluate_streaming(chunks, bins=HIST_BINS, threshold=None, plots=True):
+    """Streaming counterpart of evaluate(): same outputs, memory bounded by one chunk."""
+    ev = StreamingEvaluator(bins, threshold)
+    for scores, flagged, y_true in chunks:
+        ev.update(scores, y_true, flagged)
+    cm = ev.cm.reshape(2, 2)
+    report = report_from_cm(cm)
+    c = ev.curves()
+    extra = {k: c[k] for k in ("roc_auc", "roc_auc_error_bound", "average_precision",
+                                "average_precision_error_bound")}
+    save_outputs(cm, report, {**extra, "bins": bins, "rows": ev.rows})
+    if plots:
+        save_plots(c["fpr"], c["tpr"], c["roc_auc"], c["recall"], c["precision"])
+    return {"cm": cm, "report": report, **extra}
+
+
+def threshold_sweep(scores, y_true, n_thresholds=1000) -> pd.DataFrame:
+    """
+    Confusion counts and metrics for n_thresholds evenly spaced cutoffs
+    (prediction = score >= threshold), from one sort and one cumulative sum.
+
+    After sorting scores descending, the rows predicted positive at any
+    threshold are a prefix, so TP/FP there are the cumulative label counts
+    at the prefix length found by a binary search.
+    """
+    import numpy as np
+    import pandas as pd
+    scores = np.asarray(scores, dtype=float)
+    y = np.asarray(y_true, dtype=np.int64)
+    order = np.argsort(-scores, kind="mergesort")
+    s, y = scores[order], y[order]
+    tp_cum = np.concatenate([[0], np.cumsum(y)])
+    fp_cum = np.concatenate([[0], np.cumsum(1 - y)])
+    pos, neg = tp_cum[-1], fp_cum[-1]
+
+    thresholds = np.linspace(s.min(), s.max(), n_thresholds) if len(s) else np.array([])
+    k = np.searchsorted(-s, -thresholds, side="right")  # count of scores >= threshold
+    tp, fp = tp_cum[k], fp_cum[k]
+    fn, tn = pos - tp, neg - fp
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        recall = np.where(pos > 0, tp / max(pos, 1), 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return pd.DataFrame({
+        "threshold": thresholds,
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "precision": precision, "recall": recall, "f1": f1,
+        "alerts": tp + fp,
+        "alert_rate": (tp + fp) / max(len(s), 1),
+    })
+
+
+def best_operating_point(sweep: pd.DataFrame) -> dict:
+    """Row with the highest F1; ties go to the higher threshold (fewer alerts)."""
+    best = sweep.sort_values(["f1", "threshold"], ascending=[False, False]).iloc[0]
+    return {k: (float(v) if k in ("threshold", "precision", "recall", "f1", "alert_rate") else int(v))
+            for k, v in best.items()}
+
+
+def print_summary(results, plots=True):
+    import pandas as pd
+
+    # Console summary (nice & short)
+    cm = results["cm"]
+    rep = results["report"]
+    print("\n=== Confusion Matrix ===")
+    print(pd.DataFrame(cm, index=["Actual 0", "Actual 1"], columns=["Pred 0", "Pred 1"]))
+    print("\n=== Key Metrics ===")
+    print(f"Accuracy:        {rep['accuracy']:.4f}")
+    print(f"Precision (1):   {rep['1']['precision']:.4f}")
+    print(f"Recall    (1):   {rep['1']['recall']:.4f}")
+    print(f"F1-score  (1):   {rep['1']['f1-score']:.4f}")
+    print(f"ROC AUC:         {results['roc_auc']:.4f}")
+    print(f"\nSaved {'plots + ' if plots else ''}files in: {EXPORT_DIR.resolve()}")
+
+
 def main():
-    ap = argparse.ArgumentParser(description="Evaluate fraud model using latest FraudScore rows.")
+    ap = argparse.ArgumentParser(description="Evaluate fraud model using the latest score per transaction.")
     ap.add_argument("--threshold", type=float, default=None,
                     help="Optional: override prediction threshold; if set, y_pred = (anomaly_score >= threshold). "
                          "If omitted, uses the stored 'flagged' column.")
@@ -150,22 +373,40 @@ def main():
                          "'Amount z-score high'. 'transaction' expects a Transaction.is_fraud column.")
     ap.add_argument("--keyword", default="Amount z-score high",
                     help="Keyword to detect true fraud in reason (used when --ground-truth=reason).")
+    ap.add_argument("--sweep", type=int, metavar="N", default=None,
+                    help="Evaluate N thresholds in one pass and report the best-F1 operating point "
+                         "(writes threshold_sweep.csv and best_threshold.json; no plots).")
+    ap.add_argument("--streaming", action="store_true",
+                    help="Read scores in chunks and evaluate from per-class score histograms in constant "
+                         "memory; AUCs are approximate and reported with an error bound.")
+    ap.add_argument("--bins", type=int, default=HIST_BINS,
+                    help="Histogram bins over [0, 1] for --streaming (more bins = tighter bounds).")
+    ap.add_argument("--chunk", type=int, default=CHUNK_ROWS,
+                    help="Rows fetched per chunk for --streaming.")
+    ap.add_argument("--no-plots", action="store_true",
+                    help="Skip roc.png / pr_curve.png (and the matplotlib import).")
     args = ap.parse_args()
+    if args.streaming and args.sweep:
+        ap.error("--sweep needs every score in memory; it cannot be combined with --streaming")
+
+    if args.streaming:
+        chunks = iter_latest_scores(args.ground_truth, args.keyword, args.chunk)
+        results = evaluate_streaming(chunks, args.bins, args.threshold, plots=not args.no_plots)
+        print_summary(results, plots=not args.no_plots)
+        print(f"Avg precision:   {results['average_precision']:.4f}")
+        print(f"AUC error bound: ROC ±{results['roc_auc_error_bound']:.2e}, "
+              f"AP ±{results['average_precision_error_bound']:.2e} ({args.bins} bins)")
+        return
 
     latest = fetch_latest_scores()
 
     # Ground truth labels
     if args.ground_truth == "transaction" and try_label_from_transaction_flag():
+        import pandas as pd
         q = """
-        WITH latest AS (
-          SELECT txn_id, MAX(score_id) AS max_sid
-          FROM FraudScore
-          GROUP BY txn_id
-        )
-        SELECT fs.txn_id, t.is_fraud
-        FROM FraudScore fs
-        JOIN latest l ON l.txn_id = fs.txn_id AND l.max_sid = fs.score_id
-        JOIN Transaction t ON t.txn_id = fs.txn_id
+        SELECT l.txn_id, t.is_fraud
+        FROM FraudScoreLatest l
+        JOIN Transaction t ON t.txn_id = l.txn_id
         """
         with get_conn() as conn:
             truth_df = pd.read_sql(q, conn)
@@ -173,28 +414,30 @@ def main():
     else:
         y_true = label_from_reason(latest, args.keyword).values
 
+    if args.sweep:
+        sweep = threshold_sweep(latest["anomaly_score"].values, y_true, args.sweep)
+        best = best_operating_point(sweep)
+        sweep.to_csv(EXPORT_DIR / "threshold_sweep.csv", index=False)
+        with open(EXPORT_DIR / "best_threshold.json", "w") as f:
+            json.dump(best, f, indent=2)
+        print(f"\n=== Threshold sweep ({len(sweep)} thresholds) ===")
+        print(f"Best threshold:  {best['threshold']:.4f}")
+        print(f"Precision (1):   {best['precision']:.4f}")
+        print(f"Recall    (1):   {best['recall']:.4f}")
+        print(f"F1-score  (1):   {best['f1']:.4f}")
+        print(f"Alerts:          {best['alerts']} ({best['alert_rate']:.2%} of scored)")
+        print(f"\nSaved sweep in: {EXPORT_DIR.resolve()}")
+        return
+
     # Predictions: either stored 'flagged' or recomputed threshold
     if args.threshold is not None:
         y_pred = (latest["anomaly_score"].values >= args.threshold).astype(int)
     else:
         y_pred = latest["flagged"].values
 
-    results = evaluate(latest, y_true, y_pred)
-
-    # Console summary (nice & short)
-    cm = results["cm"]
-    tn, fp, fn, tp = cm.ravel()
-    rep = results["report"]
-    print("\n=== Confusion Matrix ===")
-    print(pd.DataFrame(cm, index=["Actual 0", "Actual 1"], columns=["Pred 0", "Pred 1"]))
-    print("\n=== Key Metrics ===")
-    print(f"Accuracy:        {rep['accuracy']:.4f}")
-    print(f"Precision (1):   {rep['1']['precision']:.4f}")
-    print(f"Recall    (1):   {rep['1']['recall']:.4f}")
-    print(f"F1-score  (1):   {rep['1']['f1-score']:.4f}")
-    print(f"ROC AUC:         {results['roc_auc']:.4f}")
-    print(f"\nSaved plots + files in: {EXPORT_DIR.resolve()}")
+    results = evaluate(latest, y_true, y_pred, plots=not args.no_plots)
 
+    print_summary(results, plots=not args.no_plots)
 
 if __name__ == "__main__":
     main()
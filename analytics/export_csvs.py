@@ -1,63 +1,153 @@
 # analytics/export_csvs.py
+from __future__ import annotations
 import sys
 import os
+import argparse
+import csv
+import gzip
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING
 from app.db import get_conn
+from analytics.rollups import refresh_rollups
+if TYPE_CHECKING:
+    import pandas as pd  # csv exports stream through the csv module; pandas loads only for parquet / q()
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 EXPORT_DIR = Path("analytics/exports")
 EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+CHUNK_ROWS = 10000  # rows fetched and written per step
 
-def to_csv(df: pd.DataFrame, name: str):
-    out = EXPORT_DIR / name
-    df.to_csv(out, index=False)
-    print(f"✓ wrote {out.resolve()}  ({len(df)} rows)")
+def _write_csv(chunks, cols, out, compress):
+    opener = gzip.open if compress else open
+    n = 0
+    with opener(out, "wt", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        for rows in chunks:
+            w.writerows(rows)
+            n += len(rows)
+    return n
+
+def _write_parquet(chunks, cols, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pandas as pd
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+    writer, n = None, 0
+    chunks = iter(chunks)
+    while True:
+        rows = next(chunks, [])
+        if rows or writer is None:  # an empty result still gets a file with its columns
+            table = pa.Table.from_pandas(pd.DataFrame.from_records(rows, columns=cols), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+            n += len(rows)
+        if not rows:
+            break
+    writer.close()
+    return n
+
+def write_export(chunks, cols, name: str, fmt="csv", compress=False):
+    """Write an iterable of row lists to analytics/exports/<name>.csv[.gz] or .parquet; returns (path, rows)."""
+    out = EXPORT_DIR / (name + (".parquet" if fmt == "parquet" else ".csv.gz" if compress else ".csv"))
+    if fmt == "parquet":
+        n = _write_parquet(chunks, cols, out)
+    else:
+        n = _write_csv(chunks, cols, out, compress)
+    return out, n
+
+def stream_export(sql: str, name: str, fmt="csv", compress=False, chunk=CHUNK_ROWS):
+    """
+    Run one export query on its own connection and stream the rows to
+    analytics/exports/<name>.csv[.gz] or .parquet, chunk rows at a time,
+    so memory stays bounded however large the result is.
+    """
+    with get_conn() as conn:
+        cur = conn.cursor(buffered=False)
+        cur.execute(sql)
+        cols = [d[0] for d in cur.description]
+        return write_export(iter(lambda: cur.fetchmany(chunk), []), cols, name, fmt, compress)
 
 def q(sql: str, params=None) -> pd.DataFrame:
+    import pandas as pd
     with get_conn() as conn:
         return pd.read_sql(sql, conn, params=params)
 
-def export_transactions_daily():
-    sql = """
-        SELECT DATE(txn_time) AS day,
-               COUNT(*) AS txn_count,
-               SUM(amount) AS total_amount
-        FROM Transaction
-        GROUP BY day
-        ORDER BY day;
-    """
-    to_csv(q(sql), "transactions_daily.csv")
-
-def export_fraud_by_region():
-    sql = """
-        SELECT c.region,
-               ROUND(AVG(fs.anomaly_score), 4) AS avg_fraud_prob,
-               SUM(fs.flagged) AS flags,
-               COUNT(*) AS scored_rows
-        FROM FraudScore fs
-        JOIN Transaction t ON t.txn_id = fs.txn_id
-        JOIN Account a ON a.account_id = t.account_id
-        JOIN Customer c ON c.customer_id = a.customer_id
-        GROUP BY c.region
-        ORDER BY avg_fraud_prob DESC;
-    """
-    to_csv(q(sql), "fraud_by_region.csv")
-
-def export_loan_stats():
-    sql = """
-        SELECT status,
-               COUNT(*) AS cnt,
-               SUM(amount) AS total_amount
-        FROM Loan
-        GROUP BY status
-        ORDER BY cnt DESC;
-    """
-    to_csv(q(sql), "loan_stats.csv")
+TRANSACTIONS_DAILY_SQL = """
+    SELECT day, txn_count, total_amount
+    FROM TxnDailyRollup
+    ORDER BY day;
+"""
+
+FRAUD_BY_REGION_SQL = """
+    SELECT NULLIF(region, '') AS region,
+           ROUND(score_sum / scored_rows, 4) AS avg_fraud_prob,
+           flags,
+           scored_rows
+    FROM RegionScoreRollup
+    WHERE scored_rows > 0
+    ORDER BY avg_fraud_prob DESC;
+"""
+
+LOAN_STATS_SQL = """
+    SELECT status,
+           COUNT(*) AS cnt,
+           SUM(amount) AS total_amount
+    FROM Loan
+    GROUP BY status
+    ORDER BY cnt DESC;
+"""
+
+def export_transactions_daily(fmt="csv", compress=False):
+    return stream_export(TRANSACTIONS_DAILY_SQL, "transactions_daily", fmt, compress)
+
+def export_fraud_by_region(fmt="csv", compress=False):
+    return stream_export(FRAUD_BY_REGION_SQL, "fraud_by_region", fmt, compress)
+
+def export_loan_stats(fmt="csv", compress=False):
+    return stream_export(LOAN_STATS_SQL, "loan_stats", fmt, compress)
+
+TRANSFER_GRAPH_COLS = ["account_id", "fan_in", "fan_out", "amount_in", "amount_out",
+                       "cycle_len", "in_amount_2hop", "out_amount_2hop"]
+
+def transfer_graph_rows(graph, chunk=CHUNK_ROWS):
+    """Per-account transfer-network metrics, chunk accounts at a time."""
+    accounts = graph.accounts()
+    for start in range(0, len(accounts), chunk):
+        rows = []
+        for a in accounts[start:start + chunk]:
+            fan_in, fan_out, cycle_len, in_2hop, out_2hop = graph.account_features(a)
+            rows.append((a, int(fan_in), int(fan_out), round(float(graph.amount_in[a]), 2),
+                         round(float(graph.amount_out[a]), 2), int(cycle_len), round(in_2hop, 2), round(out_2hop, 2)))
+        yield rows
+
+def export_transfer_graph(fmt="csv", compress=False):
+    from app.transfer_graph import TransferGraph
+    graph = TransferGraph()
+    graph.rebuild()  # TRANSFER_GRAPH_DAYS of history, as the scorer sees it
+    return write_export(transfer_graph_rows(graph), TRANSFER_GRAPH_COLS, "transfer_graph", fmt, compress)
+
+EXPORTERS = [export_transactions_daily, export_fraud_by_region, export_loan_stats, export_transfer_graph]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export analytics tables for the Tableau dashboard.")
+    ap.add_argument("--format", choices=["csv", "parquet"], default="csv",
+                    help="Output format; parquet needs pyarrow (default csv).")
+    ap.add_argument("--gzip", action="store_true", help="Write gzip-compressed .csv.gz files.")
+    ap.add_argument("--workers", type=int, default=len(EXPORTERS),
+                    help="Exports run concurrently, each on its own connection.")
+    args = ap.parse_args(argv)
 
-def main():
-    export_transactions_daily()
-    export_fraud_by_region()
-    export_loan_stats()
+    refresh_rollups()  # fold in rows added since the last export
+    with ThreadPoolExecutor(args.workers) as pool:
+        futures = [pool.submit(fn, args.format, args.gzip) for fn in EXPORTERS]
+        # reported here, in EXPORTERS order, so the worker threads' lines never interleave
+        for f in futures:
+            out, n = f.result()
+            print(f"✓ wrote {out.resolve()}  ({n} rows)")
     print("\nAll exports done. Use these in Tableau Public (Connect → Text file).")
 
 if __name__ == "__main__":
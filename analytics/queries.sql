@@ -6,7 +6,7 @@ ORDER BY day;
 
 -- 2) Fraud probability per region (avg anomaly score + count of flags)
 SELECT c.region, ROUND(AVG(fs.anomaly_score),4) AS avg_fraud_prob, SUM(fs.flagged) AS flags
-FROM FraudScore fs
+FROM FraudScoreLatest fs
 JOIN Transaction t ON t.txn_id = fs.txn_id
 JOIN Account a ON a.account_id = t.account_id
 JOIN Customer c ON c.customer_id = a.customer_id
@@ -19,10 +19,10 @@ FROM Loan
 GROUP BY status
 ORDER BY cnt DESC;
 
--- 4) Top suspicious recent transactions
+-- 4) Top suspicious recent transactions (latest score per transaction)
 SELECT fs.scored_at, fs.anomaly_score, fs.flagged, fs.reason,
        t.txn_id, t.account_id, t.amount, t.channel, t.location
-FROM FraudScore fs
+FROM FraudScoreLatest fs
 JOIN Transaction t ON t.txn_id = fs.txn_id
 ORDER BY fs.scored_at DESC
 LIMIT 20;
\ No newline at end of file
@@ -0,0 +1,125 @@
+# analytics/rollups.py
+"""
+Incrementally maintained rollup tables for the analytics exports.
+
+Each rollup remembers (in Watermark) the last base-table id it has folded
+in, and a refresh only aggregates rows above that id, so its cost follows
+the number of new rows rather than the size of the history.
+
+Ids are handed out at INSERT time, so a row can commit after higher ids
+are visible. A refresh therefore stops at a safe point: the end of the
+gap-free id run above the watermark, or -- to get past ids that never
+appear (rollbacks) -- the MAX id an earlier refresh recorded at least
+ROLLUP_GAP_GRACE seconds ago, by when every transaction holding a lower
+id has finished.
+
+- TxnDailyRollup:    per-day transaction count/amount, from Transaction.txn_id
+- RegionScoreRollup: per-region sums over each transaction's latest score,
+                     from FraudScore.score_id. A rescored transaction retracts
+                     its previous latest score and adds the new one.
+
+Run directly (python -m analytics.rollups) or let export_csvs refresh first.
+"""
+import os
+from datetime import datetime
+
+from app.db import get_conn
+
+GAP_GRACE = float(os.getenv("ROLLUP_GAP_GRACE", "120"))  # seconds an id may take to commit
+
+DAILY_SQL = """
+    INSERT INTO TxnDailyRollup (day, txn_count, total_amount)
+    SELECT DATE(txn_time), COUNT(*), SUM(amount)
+    FROM Transaction
+    WHERE txn_id > %s AND txn_id <= %s
+    GROUP BY DATE(txn_time)
+    ON DUPLICATE KEY UPDATE txn_count = txn_count + VALUES(txn_count),
+                            total_amount = total_amount + VALUES(total_amount)
+"""
+
+# new latest score per rescored txn (+) minus the latest it had before this range (-)
+REGION_SQL = """
+    INSERT INTO RegionScoreRollup (region, score_sum, flags, scored_rows)
+    SELECT region, SUM(ds), SUM(df), SUM(dn)
+    FROM (
+        SELECT COALESCE(c.region, '') AS region, fs.anomaly_score AS ds, fs.flagged AS df, 1 AS dn
+        FROM (SELECT MAX(score_id) AS sid FROM FraudScore
+              WHERE score_id > %s AND score_id <= %s
+              GROUP BY txn_id) n
+        JOIN FraudScore fs ON fs.score_id = n.sid
+        JOIN Transaction t ON t.txn_id = fs.txn_id
+        JOIN Account a ON a.account_id = t.account_id
+        JOIN Customer c ON c.customer_id = a.customer_id
+        UNION ALL
+        SELECT COALESCE(c.region, ''), -fs.anomaly_score, -fs.flagged, -1
+        FROM (SELECT MAX(p.score_id) AS sid FROM FraudScore p
+              WHERE p.score_id <= %s
+                AND p.txn_id IN (SELECT txn_id FROM FraudScore WHERE score_id > %s AND score_id <= %s)
+              GROUP BY p.txn_id) o
+        JOIN FraudScore fs ON fs.score_id = o.sid
+        JOIN Transaction t ON t.txn_id = fs.txn_id
+        JOIN Account a ON a.account_id = t.account_id
+        JOIN Customer c ON c.customer_id = a.customer_id
+    ) d
+    WHERE TRUE
+    GROUP BY region
+    ON DUPLICATE KEY UPDATE score_sum = score_sum + VALUES(score_sum),
+                            flags = flags + VALUES(flags),
+                            scored_rows = scored_rows + VALUES(scored_rows)
+"""
+
+ROLLUPS = {
+    # watermark name: (base table, id column, statement, params for (lo, hi))
+    "rollup_txn_daily": ("Transaction", "txn_id", DAILY_SQL, lambda lo, hi: (lo, hi)),
+    "rollup_region_scores": ("FraudScore", "score_id", REGION_SQL, lambda lo, hi: (lo, hi, lo, lo, hi)),
+}
+
+def _gap_free_end(cur, table, id_col, lo):
+    """Highest id h such that every id in lo+1..h is visible (lo if lo+1 is not)."""
+    cur.execute(f"SELECT 1 FROM {table} WHERE {id_col} = %s", (lo + 1,))
+    if cur.fetchone() is None:
+        return lo
+    cur.execute(f"""SELECT MIN(t.{id_col}) FROM {table} t
+                    WHERE t.{id_col} > %s
+                      AND NOT EXISTS (SELECT 1 FROM {table} u WHERE u.{id_col} = t.{id_col} + 1)""", (lo,))
+    return int(cur.fetchone()[0])
+
+def _settled(cur, name, top, now):
+    """MAX id recorded at least GAP_GRACE ago (0 if none); records `top` once that one is used up."""
+    seen = name + ":seen"
+    cur.execute("SELECT last_id, updated_at FROM Watermark WHERE name=%s", (seen,))
+    row = cur.fetchone()
+    if row is not None and (now - row[1]).total_seconds() < GAP_GRACE:
+        return 0
+    cur.execute("""INSERT INTO Watermark (name, last_id, updated_at) VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE last_id=VALUES(last_id), updated_at=VALUES(updated_at)""",
+                (seen, top, now))
+    return int(row[0]) if row is not None else 0
+
+def refresh(name):
+    """Fold rows above the rollup's watermark, up to its safe point, in; returns (from_id, to_id)."""
+    table, id_col, sql, params = ROLLUPS[name]
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT IGNORE INTO Watermark (name, last_id) VALUES (%s, 0)", (name,))
+        conn.start_transaction()
+        # the row lock serializes concurrent refreshes so nothing is counted twice
+        cur.execute("SELECT last_id FROM Watermark WHERE name=%s FOR UPDATE", (name,))
+        lo = int(cur.fetchone()[0])
+        cur.execute(f"SELECT COALESCE(MAX({id_col}), 0) FROM {table}")
+        top = int(cur.fetchone()[0])
+        hi = max(_gap_free_end(cur, table, id_col, lo), _settled(cur, name, top, datetime.now()))
+        if hi > lo:
+            cur.execute(sql, params(lo, hi))
+            cur.execute("UPDATE Watermark SET last_id=%s WHERE name=%s", (hi, name))
+        conn.commit()
+    return lo, hi
+
+def refresh_rollups():
+    for name in ROLLUPS:
+        lo, hi = refresh(name)
+        if hi > lo:
+            print(f"✓ {name}: folded ids {lo + 1}..{hi}")
+
+if __name__ == "__main__":
+    refresh_rollups()
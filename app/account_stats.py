@@ -0,0 +1,179 @@
+import math
+import threading
+from app.db import get_conn
+from app.folded import FoldedIds
+
+def stats_query(account_ids):
+    """SQL + params loading the persisted stats of the given accounts."""
+    ids = list(account_ids)
+    return ("SELECT account_id, n, mean, m2, last_txn_id FROM AccountStats "
+            f"WHERE account_id IN ({','.join(['%s'] * len(ids))})", ids)
+
+class AccountStatsStore:
+    """
+    Running amount statistics per account (count, mean, M2 via Welford),
+    cached in memory and persisted to AccountStats.
+
+    Each account also persists the last txn_id folded into its stats, and
+    the store remembers the ids it folded itself (see FoldedIds), so
+    replaying a transaction (e.g. a full-window rescore, or the rows a
+    restart re-reads) never counts it twice, while a late-committing row
+    below ids already folded still counts once. z-scores no longer depend
+    on which batch a row landed in.
+    """
+
+    def __init__(self, snapshot=None, folded=()):
+        self._stats = {}   # account_id -> [n, mean, m2, last_txn_id]
+        self._base = {}    # account_id -> last_txn_id as loaded: folded before this process
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self.folded = FoldedIds(ids=folded)
+        if snapshot:
+            # detached copy (e.g. in a scoring worker): every account is preloaded, no DB access;
+            # `folded` lists the ids the owner had already folded
+            self._stats = {a: list(s) for a, s in snapshot.items()}
+
+    def snapshot(self, account_ids=None, dirty_only=False):
+        """Plain-dict copy of the given (or dirty, or all) accounts, cheap to pickle across processes."""
+        with self._lock:
+            if dirty_only:
+                account_ids = self._dirty
+            elif account_ids is None:
+                account_ids = self._stats
+            return {int(a): list(self._stats[int(a)]) for a in account_ids}
+
+    def merge(self, snapshot, txn_ids=()):
+        """Adopt stats computed elsewhere (e.g. by a worker that owned these accounts) from txn_ids."""
+        with self._lock:
+            for a, s in snapshot.items():
+                self._stats[a] = list(s)
+                self._dirty.add(a)
+            for t in txn_ids:
+                self.folded.add(int(t))
+
+    def replays(self, df):
+        """txn_ids of df already folded in (accounts must be loaded)."""
+        with self._lock:
+            return [int(t) for a, t in zip(df["account_id"].tolist(), df["txn_id"].tolist())
+                    if t <= self._base.get(a, 0) or t in self.folded]
+
+    def load(self, account_ids, cur=None):
+        """Cache the persisted stats of accounts not loaded yet, read on `cur` if given."""
+        with self._lock:
+            missing = [int(a) for a in set(account_ids) if a not in self._stats]
+            if not missing:
+                return
+            if cur is None:
+                with get_conn() as conn:
+                    rows = self._read(conn.cursor(), missing)
+            else:
+                rows = self._read(cur, missing)
+            for acc, n, mean, m2, last in rows:
+                self._stats[acc] = [int(n), float(mean), max(float(m2), 0.0), int(last)]
+                self._base[acc] = int(last)
+            for acc in missing:
+                self._stats.setdefault(acc, [0, 0.0, 0.0, 0])
+
+    @staticmethod
+    def _read(cur, account_ids):
+        cur.execute(*stats_query(account_ids))
+        return cur.fetchall()
+
+    def update(self, account_id, txn_id, amount):
+        s = self._stats[account_id]
+        if txn_id <= self._base.get(account_id, 0) or not self.folded.claim(txn_id):
+            return
+        s[0] += 1
+        delta = amount - s[1]
+        s[1] += delta / s[0]
+        s[2] += delta * (amount - s[1])
+        s[3] = max(s[3], txn_id)
+        self._dirty.add(account_id)
+
+    def zscore(self, account_id, amount):
+        n, mean, m2, _ = self._stats[account_id]
+        if n < 2:
+            return 0.0
+        std = math.sqrt(max(m2, 0.0) / (n - 1))  # sample std, as pandas uses
+        return (amount - mean) / (std if std > 0 else 1.0)
+
+    def preview_zscore(self, account_id, amount):
+        """z-score `amount` would get once folded in, without changing the stats (account must be loaded)."""
+        n, mean, m2, _ = self._stats[account_id]
+        n += 1
+        delta = amount - mean
+        mean += delta / n
+        m2 += delta * (amount - mean)
+        if n < 2:
+            return 0.0
+        std = math.sqrt(max(m2, 0.0) / (n - 1))
+        return (amount - mean) / (std if std > 0 else 1.0)
+
+    def zscores(self, df, update=True):
+        """z_by_account for every row of df; with update=True rows are folded in txn_id order first."""
+        import numpy as np
+        acc = df["account_id"].to_numpy()
+        txn = df["txn_id"].to_numpy()
+        amt = df["amount"].to_numpy(dtype=float)
+        z = np.zeros(len(df))
+        with self._lock:
+            self.load(acc.tolist())
+            for i in np.argsort(txn, kind="stable"):
+                a = int(acc[i])
+                if update:
+                    self.update(a, int(txn[i]), float(amt[i]))
+                z[i] = self.zscore(a, float(amt[i]))
+        return z
+
+    def flush(self):
+        with self._lock:
+            rows = [(a, *self._stats[a]) for a in self._dirty]
+            self._dirty.clear()
+        if not rows:
+            return 0
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.executemany(
+                """INSERT INTO AccountStats (account_id, n, mean, m2, last_txn_id) VALUES (%s,%s,%s,%s,%s)
+                   ON DUPLICATE KEY UPDATE n=VALUES(n), mean=VALUES(mean), m2=VALUES(m2),
+                                           last_txn_id=VALUES(last_txn_id)""",
+                rows
+            )
+        return len(rows)
+
+    def is_empty(self):
+        with get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM AccountStats LIMIT 1")
+            return cur.fetchone() is None
+
+    def rebuild(self, upto_txn_id):
+        """
+        Recompute every account's stats from Transaction rows up to upto_txn_id.
+        M2 is summed around the account's mean (two passes), not as
+        SUM(x*x) - n*mean^2, which cancels to slightly negative values for
+        repeated equal amounts.
+        """
+        with self._lock, get_conn() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO AccountStats (account_id, n, mean, m2, last_txn_id)
+                SELECT t.account_id, COUNT(*), a.mean,
+                       SUM((t.amount - a.mean) * (t.amount - a.mean)),
+                       MAX(t.txn_id)
+                FROM Transaction t
+                JOIN (SELECT account_id, AVG(amount) AS mean
+                      FROM Transaction
+                      WHERE txn_id <= %s
+                      GROUP BY account_id) a ON a.account_id = t.account_id
+                WHERE t.txn_id <= %s
+                GROUP BY t.account_id, a.mean
+                ON DUPLICATE KEY UPDATE n=VALUES(n), mean=VALUES(mean), m2=VALUES(m2),
+                                        last_txn_id=VALUES(last_txn_id)
+            """, (int(upto_txn_id), int(upto_txn_id)))
+            self._stats.clear()
+            self._base.clear()
+            self._dirty.clear()
+            self.folded = FoldedIds()
+
+account_stats = AccountStatsStore()
@@ -0,0 +1,51 @@
+import os
+import time
+from app.db import get_conn
+
+WRITE_BATCH = int(os.getenv("DB_WRITE_BATCH", "2000"))  # rows per multi-row INSERT / commit
+
+def report_flush(table, stat):
+    print(f"  {table}: flushed {stat['rows']} rows in {stat['seconds']:.3f}s ({stat['rows_per_s']:,.0f} rows/s)")
+
+def bulk_insert(table, columns, rows, batch_size=WRITE_BATCH, suffix="", final=(), also=(),
+                report=report_flush):
+    """
+    Insert rows as multi-row INSERT ... VALUES statements of batch_size rows,
+    one explicit transaction (and commit) per batch.
+
+    `suffix` is appended to every statement (e.g. an ON DUPLICATE KEY UPDATE
+    clause); `also` is a list of (table, suffix) that receive the same rows
+    in the same transaction (e.g. a maintained latest-row table); `final` is
+    a list of (sql, params) run inside the last batch's transaction, so
+    bookkeeping such as a watermark commits with the data.
+    Returns one {rows, seconds, rows_per_s} dict per flush.
+    """
+    row_sql = "(" + ",".join(["%s"] * len(columns)) + ")"
+    targets = [(table, suffix), *also]
+    flushes = []
+    with get_conn() as conn:
+        cur = conn.cursor()
+        starts = range(0, len(rows), batch_size) if rows else [0]
+        for start in starts:
+            chunk = rows[start:start + batch_size]
+            t0 = time.perf_counter()
+            conn.start_transaction()
+            try:
+                if chunk:
+                    values = ",".join([row_sql] * len(chunk))
+                    params = [v for row in chunk for v in row]
+                    for target, tail in targets:
+                        cur.execute(f"INSERT INTO {target} ({', '.join(columns)}) VALUES {values}{tail}", params)
+                if start + batch_size >= len(rows):
+                    for sql, params in final:
+                        cur.execute(sql, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            dt = time.perf_counter() - t0
+            stat = {"rows": len(chunk), "seconds": dt, "rows_per_s": len(chunk) / dt if dt > 0 else 0.0}
+            flushes.append(stat)
+            if report and chunk:
+                report(table, stat)
+    return flushes
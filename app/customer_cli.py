@@ -1,67 +1,118 @@
 from app.db import get_conn
 from app.auth import login
+from app.notify import notify_new_txns
+from app.preauth import TransactionHeld, TransactionRejected, get_preauth
 
 def ensure_customer(user):
     if not user or user["role"] != "CUSTOMER":
         raise PermissionError("Customer only.")
 
+def enqueue_for_scoring(cur):
+    # outbox entry for the Transaction row just inserted on this cursor; commits with it
+    txn_id = cur.lastrowid
+    cur.execute("INSERT INTO ScoringOutbox (txn_id) VALUES (%s)", (txn_id,))
+    return txn_id
+
+def preauthorize(conn, cur, account_id, amount, channel, txn_type, counterparty=None):
+    # optional inline fraud check (PREAUTH_ENABLED=1); raises TransactionHeld / TransactionRejected
+    scorer = get_preauth()
+    if scorer is None:
+        return
+    try:
+        scorer.enforce(account_id, amount, channel, scorer.region_of(cur, account_id))
+    except TransactionHeld as held:
+        # nothing is posted yet: record the hold for review in place of the posting
+        cur.execute("""INSERT INTO HeldTransaction (account_id, txn_type, amount, counterparty_account, channel, score)
+                       VALUES (%s,%s,%s,%s,%s,%s)""", (account_id, txn_type, amount, counterparty, channel, held.score))
+        conn.commit()
+        raise
+
+def fold_posted(*postings):
+    # this session's next pre-authorization checks see its own committed postings
+    scorer = get_preauth()
+    if scorer is not None:
+        for txn_id, account_id, amount, channel in postings:
+            scorer.fold(txn_id, account_id, amount, channel, "Local")
+
 def deposit(account_id, amount):
     with get_conn() as conn:
+        conn.start_transaction()
         cur = conn.cursor()
         cur.execute("UPDATE Account SET balance = balance + %s WHERE account_id=%s", (amount, account_id))
         cur.execute("""INSERT INTO Transaction (account_id, txn_type, amount, channel, location)
                        VALUES (%s,'DEPOSIT',%s,'BRANCH','Local')""", (account_id, amount))
+        txn_id = enqueue_for_scoring(cur)
+        conn.commit()
+    fold_posted((txn_id, account_id, amount, "BRANCH"))
+    notify_new_txns()
 
 def withdraw(account_id, amount):
     with get_conn() as conn:
+        conn.start_transaction()
         cur = conn.cursor()
         # naive check
         cur.execute("SELECT balance FROM Account WHERE account_id=%s FOR UPDATE", (account_id,))
         bal = cur.fetchone()[0]
         if bal < amount:
             raise ValueError("Insufficient funds")
+        preauthorize(conn, cur, account_id, amount, "ATM", "WITHDRAW")
         cur.execute("UPDATE Account SET balance = balance - %s WHERE account_id=%s", (amount, account_id))
         cur.execute("""INSERT INTO Transaction (account_id, txn_type, amount, channel, location)
                        VALUES (%s,'WITHDRAW',%s,'ATM','Local')""", (account_id, amount))
+        txn_id = enqueue_for_scoring(cur)
+        conn.commit()
+    fold_posted((txn_id, account_id, amount, "ATM"))
+    notify_new_txns()
 
 def transfer(src_account, dst_account, amount):
     with get_conn() as conn:
+        conn.start_transaction()
         cur = conn.cursor()
         cur.execute("SELECT balance FROM Account WHERE account_id=%s FOR UPDATE", (src_account,))
         bal = cur.fetchone()[0]
         if bal < amount:
             raise ValueError("Insufficient funds")
+        preauthorize(conn, cur, src_account, amount, "ONLINE", "TRANSFER_OUT", dst_account)
         cur.execute("UPDATE Account SET balance = balance - %s WHERE account_id=%s", (amount, src_account))
         cur.execute("UPDATE Account SET balance = balance + %s WHERE account_id=%s", (amount, dst_account))
         cur.execute("""INSERT INTO Transaction (account_id, txn_type, amount, channel, location, counterparty_account)
                        VALUES (%s,'TRANSFER_OUT',%s,'ONLINE','Local',%s)""", (src_account, amount, dst_account))
+        out_id = enqueue_for_scoring(cur)
         cur.execute("""INSERT INTO Transaction (account_id, txn_type, amount, channel, location, counterparty_account)
                        VALUES (%s,'TRANSFER_IN',%s,'ONLINE','Local',%s)""", (dst_account, amount, src_account))
+        in_id = enqueue_for_scoring(cur)
+        conn.commit()
+    fold_posted((out_id, src_account, amount, "ONLINE"), (in_id, dst_account, amount, "ONLINE"))
+    notify_new_txns()
 
 def run():
     u = login(input("Username: "), input("Password: "))
     ensure_customer(u)
+    get_preauth()  # load the model up front so the first posting stays within budget
     print("Customer menu: 1) Deposit 2) Withdraw 3) Transfer 0) Exit")
     while True:
         c = input("> ")
-        if c == "1":
-            aid = int(input("Account ID: "))
-            amt = float(input("Amount: "))
-            deposit(aid, amt)
-            print("Deposited.")
-        elif c == "2":
-            aid = int(input("Account ID: "))
-            amt = float(input("Amount: "))
-            withdraw(aid, amt)
-            print("Withdrawn.")
-        elif c == "3":
-            src = int(input("From Account: "))
-            dst = int(input("To Account: "))
-            amt = float(input("Amount: "))
-            transfer(src, dst, amt)
-            print("Transferred.")
-        elif c == "0":
-            break
+        try:
+            if c == "1":
+                aid = int(input("Account ID: "))
+                amt = float(input("Amount: "))
+                deposit(aid, amt)
+                print("Deposited.")
+            elif c == "2":
+                aid = int(input("Account ID: "))
+                amt = float(input("Amount: "))
+                withdraw(aid, amt)
+                print("Withdrawn.")
+            elif c == "3":
+                src = int(input("From Account: "))
+                dst = int(input("To Account: "))
+                amt = float(input("Amount: "))
+                transfer(src, dst, amt)
+                print("Transferred.")
+            elif c == "0":
+                break
+        except (TransactionHeld, TransactionRejected) as e:
+            print(e)
 
 if __name__ == "__main__":
     run()
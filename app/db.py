@@ -1,10 +1,24 @@
 import mysql.connector as mysql
+from mysql.connector import errors
 from dotenv import load_dotenv
 import os
+import queue
+import threading
+import time
 
 load_dotenv()
 
-def get_conn():
+BACKEND = os.getenv("DB_BACKEND", "mysql")                       # "mysql" or "sqlite" (embedded, in-process)
+SQLITE_PATH = os.getenv("DB_SQLITE_PATH", "bankfraud.sqlite3")   # database file for DB_BACKEND=sqlite
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))        # seconds to wait for a free connection
+POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30"))  # idle seconds before a health check
+
+def connect():
+    """Open a new, unpooled connection."""
+    if BACKEND == "sqlite":
+        from app.sqlite_db import connect as sqlite_connect
+        return sqlite_connect(SQLITE_PATH)
     return mysql.connect(
         host=os.getenv("DB_HOST","127.0.0.1"),
         port=int(os.getenv("DB_PORT","3307")),
@@ -13,3 +27,161 @@ def get_conn():
         database=os.getenv("DB_NAME","bankfraud"),
         autocommit=True
     )
+
+class PooledConnection:
+    """
+    Wraps a pooled connection. Everything is delegated to the underlying
+    connection except close() (and leaving a `with` block), which hands it
+    back to the pool instead of tearing down the socket.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_conn", conn)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            object.__setattr__(self, "_conn", None)
+
+class ConnectionPool:
+    """Fixed-size pool with lazy connect, stale-connection checks and wait/exhaustion counters."""
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_after=POOL_PING_AFTER):
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()  # (conn, last_used); LIFO keeps hot connections hot
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock)  # an idle connection or a free slot appeared
+        self._created = 0
+        self._stats = {
+            "checkouts": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+            "exhausted": 0,   # checkouts that found every connection busy
+            "timeouts": 0,
+            "reconnects": 0,
+        }
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _open(self):
+        try:
+            return connect()
+        except Exception:
+            self._vacate()
+            raise
+
+    def _vacate(self):
+        # a slot is free again: wake one checkout waiting for a connection
+        with self._freed:
+            self._created -= 1
+            self._freed.notify()
+
+    def _checked(self, conn, last_used):
+        if time.monotonic() - last_used < self.ping_after:
+            return conn
+        try:
+            conn.ping(reconnect=False)
+            return conn
+        except errors.Error:
+            self._count("reconnects")
+            try:
+                conn.close()
+            except errors.Error:
+                pass
+            return self._open()
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        exhausted = False
+        with self._freed:
+            # idle connection first, else a free slot; both checked under the lock, so no wake-up is missed
+            while True:
+                try:
+                    idle = self._idle.get_nowait()
+                    break
+                except queue.Empty:
+                    pass
+                if self._created < self.size:
+                    self._created += 1
+                    idle = None
+                    break
+                if not exhausted:
+                    self._stats["exhausted"] += 1
+                    exhausted = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise errors.PoolError(f"No free connection after {self.timeout}s (pool size {self.size})")
+                self._freed.wait(remaining)
+        conn = self._open() if idle is None else self._checked(*idle)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_total_s"] += waited
+            self._stats["wait_max_s"] = max(self._stats["wait_max_s"], waited)
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if conn.unread_result:
+                conn.consume_results()
+            if conn.in_transaction:
+                conn.rollback()
+            if not conn.autocommit:
+                conn.autocommit = True
+        except errors.Error:
+            # broken connection: drop it and let the next checkout (maybe one waiting) open a fresh one
+            try:
+                conn.close()
+            except errors.Error:
+                pass
+            self._vacate()
+            return
+        with self._freed:
+            self._idle.put((conn, time.monotonic()))
+            self._freed.notify()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats, size=self.size, open=self._created, idle=self._idle.qsize())
+        s["wait_avg_s"] = s["wait_total_s"] / s["checkouts"] if s["checkouts"] else 0.0
+        return s
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool, _pool_pid
+    with _pool_lock:
+        # a forked child must not share the parent's sockets
+        if _pool is None or _pool_pid != os.getpid():
+            _pool, _pool_pid = ConnectionPool(), os.getpid()
+        return _pool
+
+def get_conn():
+    if BACKEND == "sqlite":
+        # in-process: opening a connection is a file open, there is no socket worth pooling
+        return connect()
+    return get_pool().acquire()
+
+def pool_stats():
+    return get_pool().stats()
@@ -1,3 +1,10 @@
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
 from app.db import get_conn
 from app.auth import login
 
@@ -13,17 +20,114 @@ def approve_loan(loan_id, approve=True):
         cur.execute(q, (new_status, loan_id))
         return cur.rowcount
 
-def view_customer_history(customer_id):
+HISTORY_PAGE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))            # transactions per history page
+SUMMARY_TTL = float(os.getenv("HISTORY_SUMMARY_TTL", "30"))         # seconds an account summary is reused
+SUMMARY_CACHE_SIZE = 256                                            # customers kept in the summary cache
+
+ACCOUNTS_SQL = """
+    SELECT account_id, account_type, balance, status
+    FROM Account
+    WHERE customer_id = %s
+    ORDER BY account_id
+"""
+
+_summaries = OrderedDict()  # customer_id -> (expires_at, accounts), least recently used first
+_summaries_lock = threading.Lock()
+
+def customer_summary(customer_id, refresh=False):
+    """The customer's accounts with their latest balances, cached for SUMMARY_TTL seconds."""
+    now = time.monotonic()
+    with _summaries_lock:
+        hit = _summaries.get(customer_id)
+        if hit and hit[0] > now and not refresh:
+            _summaries.move_to_end(customer_id)
+            return hit[1]
     with get_conn() as conn:
         cur = conn.cursor(dictionary=True)
-        cur.execute("""
-            SELECT a.account_id, a.account_type, a.balance, t.txn_id, t.txn_time, t.txn_type, t.amount
-            FROM Account a
-            LEFT JOIN Transaction t ON t.account_id = a.account_id
-            WHERE a.customer_id = %s
-            ORDER BY t.txn_time DESC
-        """, (customer_id,))
-        return cur.fetchall()
+        cur.execute(ACCOUNTS_SQL, (customer_id,))
+        accounts = cur.fetchall()
+    with _summaries_lock:
+        _summaries[customer_id] = (now + SUMMARY_TTL, accounts)
+        _summaries.move_to_end(customer_id)
+        while len(_summaries) > SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+    return accounts
+
+def history_query(account_id, limit, since=None, until=None, before=None):
+    """
+    SQL + params for one account's transactions newest first, in
+    (txn_time, txn_id) order: [since, until) by txn_time, strictly older
+    than the keyset `before` = (txn_time, txn_id). Walks
+    idx_txn_account_time backwards, so it never sorts.
+    """
+    q = """
+    SELECT account_id, txn_id, txn_time, txn_type, amount
+    FROM Transaction
+    WHERE account_id = %s"""
+    params = [account_id]
+    if since is not None:
+        q += " AND txn_time >= %s"
+        params.append(since)
+    if until is not None:
+        q += " AND txn_time < %s"
+        params.append(until)
+    if before is not None:
+        # the plain txn_time bound is what the index range uses; the OR only trims ties
+        q += " AND txn_time <= %s AND (txn_time < %s OR txn_id < %s)"
+        params += [before[0], before[0], before[1]]
+    q += """
+    ORDER BY txn_time DESC, txn_id DESC
+    LIMIT %s"""
+    params.append(limit)
+    return q, params
+
+def _account_history(account_id, batch, since, until, before):
+    while True:
+        q, params = history_query(account_id, batch, since, until, before)
+        with get_conn() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(q, params)
+            rows = cur.fetchall()
+        yield from rows
+        if len(rows) < batch:
+            return
+        before = (rows[-1]["txn_time"], rows[-1]["txn_id"])
+
+def view_customer_history(customer_id, page_size=HISTORY_PAGE, since=None, until=None,
+                          account_ids=None, before=None):
+    """
+    Generator of pages (lists of at most page_size transactions, newest
+    first) across the customer's accounts, optionally only account_ids and
+    txn_time in [since, until). Each account is read page_size rows at a
+    time by keyset and the streams are merged, so a page costs the same
+    however much history the customer has. Resume from a page's last row
+    with before=(txn_time, txn_id).
+    """
+    accounts = [a["account_id"] for a in customer_summary(customer_id)]
+    if account_ids is not None:
+        wanted = set(account_ids)
+        accounts = [a for a in accounts if a in wanted]  # never another customer's account
+    streams = [_account_history(a, page_size, since, until, before) for a in accounts]
+    merged = heapq.merge(*streams, key=lambda r: (r["txn_time"], r["txn_id"]), reverse=True)
+    while True:
+        page = list(islice(merged, page_size))
+        if not page:
+            return
+        yield page
+
+def print_history(customer_id):
+    for a in customer_summary(customer_id):
+        print(f"Account {a['account_id']} ({a['account_type']}, {a['status']}): balance {a['balance']}")
+    since = input("From date (YYYY-MM-DD, blank = all): ").strip() or None
+    until = input("Before date (YYYY-MM-DD, blank = now): ").strip() or None
+    only = input("Account ID (blank = all): ").strip()
+    pages = view_customer_history(customer_id, since=since, until=until,
+                                  account_ids=[int(only)] if only else None)
+    for page in pages:
+        for r in page:
+            print(r)
+        if len(page) < HISTORY_PAGE or input("More? (Enter / q): ").lower() == "q":
+            break
 
 def run():
     u = login(input("Username: "), input("Password: "))
@@ -36,10 +140,7 @@ def run():
             ok = input("Approve? (y/n): ").lower() == "y"
             print("Updated rows:", approve_loan(lid, ok))
         elif c == "2":
-            cid = int(input("Customer ID: "))
-            rows = view_customer_history(cid)
-            for r in rows:
-                print(r)
+            print_history(int(input("Customer ID: ")))
         elif c == "0":
             break
 
@@ -0,0 +1,58 @@
+from app.transfer_graph import GRAPH_FEATURES
+from app.velocity import VELOCITY_FEATURES
+
+CHANNELS = ("BRANCH", "ATM", "ONLINE", "MOBILE")  # Transaction.channel ENUM order
+REGIONS = ("North", "West", "South", "East")      # Customer.region values; anything else encodes as -1
+FEATURES = ("amount", "channel_code", "region_code", "z_by_account", *VELOCITY_FEATURES, *GRAPH_FEATURES)
+
+class FeatureEncoder:
+    """
+    Fixed-vocabulary encoder shared by training and scoring.
+
+    Codes come from the schema rather than from whatever categories appear
+    in a batch, so the same channel/region always maps to the same number.
+    transform() writes straight into a C-contiguous float32 matrix (optionally
+    a caller-provided slice) without building an intermediate frame.
+    numpy/pandas are imported on first use, so importing the encoder (e.g.
+    from the customer CLI) stays cheap.
+    """
+
+    def __init__(self, channels=CHANNELS, regions=REGIONS):
+        self.channels = tuple(channels)
+        self.regions = tuple(regions)
+        self.features = FEATURES
+        self._channel_code = {c: i for i, c in enumerate(self.channels)}
+        self._region_code = {r: i for i, r in enumerate(self.regions)}
+
+    def signature(self):
+        """Identifies the feature layout a model was trained on."""
+        return {"features": list(self.features), "channels": list(self.channels), "regions": list(self.regions)}
+
+    @staticmethod
+    def _codes(values, vocab):
+        import pandas as pd
+        return pd.Categorical(values, categories=vocab).codes  # unknown / NULL -> -1
+
+    def alloc(self, n):
+        import numpy as np
+        return np.empty((n, len(self.features)), dtype=np.float32, order="C")
+
+    def transform(self, df, z, velocity, graph, out=None):
+        import numpy as np
+        X = self.alloc(len(df)) if out is None else out
+        X[:, 0] = df["amount"].to_numpy(dtype=np.float32)
+        X[:, 1] = self._codes(df["channel"], self.channels)
+        X[:, 2] = self._codes(df["region"], self.regions)
+        X[:, 3] = z
+        X[:, 4:4 + len(VELOCITY_FEATURES)] = velocity
+        X[:, 4 + len(VELOCITY_FEATURES):] = graph
+        np.nan_to_num(X, copy=False)
+        return X
+
+    def encode_one(self, amount, channel, region, z, velocity, graph):
+        """Single-row vector for the inline (pre-authorization) path; plain dict lookups, no pandas."""
+        import numpy as np
+        return np.array([amount, self._channel_code.get(channel, -1), self._region_code.get(region, -1),
+                         0.0 if z != z else z, *velocity, *graph], dtype=np.float32)
+
+encoder = FeatureEncoder()
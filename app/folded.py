@@ -0,0 +1,46 @@
+import os
+import time
+from collections import deque
+
+GAP_GRACE = float(os.getenv("SCORING_GAP_GRACE", "120"))  # seconds a skipped txn_id may take to commit
+
+class FoldedIds:
+    """
+    The txn_ids a derived store (running stats, velocity windows, transfer
+    graph) has folded in: every id at or below `floor`, plus each id folded
+    in the last `grace` seconds.
+
+    A row that commits late turns up below ids already folded, so "at or
+    below the highest id seen" cannot tell it from a replay; membership
+    can. An id leaves the set `grace` seconds after it was folded and the
+    floor moves up to it -- by then TxnCursor has given up on every gap
+    below it too -- so the set only holds the ids of the grace window.
+    """
+
+    def __init__(self, floor=0, ids=(), grace=GAP_GRACE):
+        self.floor = int(floor)
+        self.grace = grace
+        self.ids = set()
+        self._log = deque()  # (monotonic time folded, txn_id), oldest first
+        for i in ids:
+            self.add(i)
+
+    def __contains__(self, txn_id):
+        return txn_id <= self.floor or txn_id in self.ids
+
+    def add(self, txn_id):
+        now = time.monotonic()
+        while self._log and now - self._log[0][0] > self.grace:
+            _, old = self._log.popleft()
+            self.floor = max(self.floor, old)
+            self.ids.discard(old)
+        if txn_id not in self:
+            self.ids.add(txn_id)
+            self._log.append((now, txn_id))
+
+    def claim(self, txn_id):
+        """True (and remember it) if txn_id was not folded yet."""
+        if txn_id in self:
+            return False
+        self.add(txn_id)
+        return True
@@ -1,13 +1,174 @@
-import time
-from app.fraud_model import run_model
+import argparse
+import asyncio
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from app.account_stats import account_stats
+from app.fraud_model import (
+    BATCH_SIZE, TxnCursor, fetch_outbox_txns, load_watermark, load_model,
+    outbox_ack, score_and_write, score_batch, train_model
+)
+from app.model_registry import registry
+from app.notify import listen_for_wakeups
+
+POLL_MIN = 0.25    # seconds between polls while transactions keep arriving
+POLL_MAX = 10.0    # idle polls back off up to this
+QUEUE_DEPTH = 4    # batches buffered between stages before the upstream stage waits
+
+class Pipeline:
+    """
+    fetch -> score -> write as three asyncio tasks joined by bounded queues.
+
+    Blocking DB calls run on one thread per stage and featurize/score on its
+    own executor, so the next batch is fetched while the current one is
+    scored and the previous one written. A full queue blocks the stage
+    upstream of it, so a slow writer throttles fetching instead of piling
+    batches up in memory. Stopping lets every batch already fetched drain
+    through the write stage before exiting.
+
+    source="watermark" scans Transaction above the persisted high-water mark
+    (a TxnCursor, which re-reads ids skipped by commits that landed late);
+    source="outbox" consumes the ScoringOutbox entries that postings write,
+    so only those transactions are read; each poll claims the oldest pending
+    entries not already in the pipeline, and the write deletes exactly those. Either way the fetch stage sleeps
+    until a wake-up datagram from a posting arrives or the poll times out.
+    """
+
+    def __init__(self, workers=1, poll_min=POLL_MIN, poll_max=POLL_MAX, queue_depth=QUEUE_DEPTH,
+                 source="watermark"):
+        self.source = source
+        self.txns = None        # TxnCursor (watermark source)
+        self.in_flight = set()  # outbox_ids claimed but not yet written (outbox source)
+        self.scorer = None
+        if workers > 1:
+            from app.parallel_scoring import ParallelScorer
+            self.scorer = ParallelScorer(workers)
+        self.batch = BATCH_SIZE * max(workers, 1)
+        self.poll_min, self.poll_max = poll_min, poll_max
+        self.fetched = asyncio.Queue(queue_depth)
+        self.scored = asyncio.Queue(queue_depth)
+        self.stop = asyncio.Event()
+        self.wake = asyncio.Event()
+        self._fetch_io = ThreadPoolExecutor(1, thread_name_prefix="fetch")
+        self._score_cpu = ThreadPoolExecutor(1, thread_name_prefix="score")
+        self._write_io = ThreadPoolExecutor(1, thread_name_prefix="write")
+
+    async def _run(self, executor, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    def request_stop(self):
+        self.stop.set()
+        self.wake.set()
+
+    async def _sleep(self, seconds):
+        # long-poll: returns early on a posting's wake-up (or on stop)
+        try:
+            await asyncio.wait_for(self.wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        self.wake.clear()
+
+    def _fetch(self):
+        """Blocking fetch of the next batch: (df or None, watermark or outbox_ids the write commits, backlog remains)."""
+        if self.source == "outbox":
+            return fetch_outbox_txns(self.batch, frozenset(self.in_flight))
+        df, backlog = self.txns.fetch(self.batch)
+        return df, self.txns.safe_point(), backlog
+
+    async def fetch_stage(self):
+        interval = self.poll_min
+        while not self.stop.is_set():
+            df, cursor, backlog = await self._run(self._fetch_io, self._fetch)
+            if df is not None:
+                if self.source == "outbox":
+                    self.in_flight.update(cursor)
+                await self.fetched.put((df, cursor))
+                interval = self.poll_min
+                if backlog:
+                    continue  # fetch again right away
+            await self._sleep(interval)
+            interval = min(interval * 2, self.poll_max)  # adaptive back-off while idle
+        await self.fetched.put(None)
+
+    async def score_stage(self):
+        while (item := await self.fetched.get()) is not None:
+            df, cursor = item
+            bundle = registry.current() or await self._run(self._score_cpu, load_model)
+            if bundle is None:
+                self._release(cursor)
+                continue
+            df_f, scores = await self._run(self._score_cpu, score_batch, df, bundle, self.scorer)
+            await self.scored.put((df_f, scores, bundle, cursor))
+        await self.scored.put(None)
+
+    def _release(self, cursor):
+        # claimed entries left the pipeline (written, or dropped) and may be claimed again if still there
+        if self.source == "outbox":
+            self.in_flight.difference_update(cursor)
+
+    def _write(self, df_f, scores, bundle, cursor):
+        account_stats.flush()
+        if self.source == "outbox":
+            return score_and_write(df_f, scores, bundle, final=outbox_ack(cursor))
+        return score_and_write(df_f, scores, bundle, watermark=cursor)
+
+    async def write_stage(self):
+        while (item := await self.scored.get()) is not None:
+            flagged = await self._run(self._write_io, self._write, *item)
+            self._release(item[-1])
+            if flagged:
+                print(f"Alert: {flagged} new suspicious transactions.")
+
+    async def run(self, cursor):
+        if self.source != "outbox":
+            self.txns = TxnCursor(cursor)
+        try:
+            await asyncio.gather(self.fetch_stage(), self.score_stage(), self.write_stage())
+        finally:
+            for ex in (self._fetch_io, self._score_cpu, self._write_io):
+                ex.shutdown()
+            if self.scorer is not None:
+                self.scorer.close()
+
+def _install_signal_handlers(stop):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop)
+        except NotImplementedError:  # Windows event loops
+            signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop))
+
+async def serve(args):
+    pipeline = Pipeline(args.workers, args.poll_min, args.poll_max, args.queue_depth, args.source)
+    _install_signal_handlers(pipeline.request_stop)
+    listener = await listen_for_wakeups(pipeline.wake)
+    loop = asyncio.get_running_loop()
+    # outbox entries are deleted once scored, so that source always starts from the oldest pending one
+    cursor = 0 if args.source == "outbox" else await loop.run_in_executor(None, load_watermark)
+    await loop.run_in_executor(None, load_model)
+    registry.start_retraining(train_model)
+    try:
+        await pipeline.run(cursor)
+    finally:
+        if listener is not None:
+            listener.close()
+    print("Fraud scoring loop drained and stopped.")
 
 def main():
+    ap = argparse.ArgumentParser(description="Continuously score new transactions.")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Score on N processes, sharded by account_id (default 1 = in-process).")
+    ap.add_argument("--poll-min", type=float, default=POLL_MIN,
+                    help="Poll interval (s) while transactions are arriving.")
+    ap.add_argument("--poll-max", type=float, default=POLL_MAX,
+                    help="Longest poll interval (s) after backing off while idle.")
+    ap.add_argument("--queue-depth", type=int, default=QUEUE_DEPTH,
+                    help="Batches buffered between stages before the upstream stage waits.")
+    ap.add_argument("--source", choices=["watermark", "outbox"], default="watermark",
+                    help="'watermark' scans Transaction above the last scored txn_id; 'outbox' "
+                         "scores only the ScoringOutbox entries written by customer postings.")
+    args = ap.parse_args()
     print("Fraud scoring loop. Ctrl+C to stop.")
-    while True:
-        flagged = run_model()
-        if flagged:
-            print(f"Alert: {flagged} new suspicious transactions.")
-        time.sleep(10)  # poll every 10s (local demo)
+    asyncio.run(serve(args))
 
 if __name__ == "__main__":
     main()
@@ -1,64 +1,354 @@
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import IsolationForest
+from __future__ import annotations
+import argparse
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING
 from app.db import get_conn
+from app.bulk_writer import bulk_insert, WRITE_BATCH
+from app.account_stats import account_stats
+from app.features import encoder
+from app.folded import GAP_GRACE
+from app.transfer_graph import transfer_graph
+from app.velocity import VelocityStore, velocity
+from app.model_registry import registry
 
-def fetch_recent_txns(limit=20000):
-    with get_conn() as conn:
-        q = """
+# pandas / numpy / sklearn are imported inside the functions that need them, so the
+# daemon, the CLIs and `--help` don't pay for them until a batch is actually scored
+if TYPE_CHECKING:
+    import pandas as pd
+
+WATERMARK = "fraud_daemon"  # Watermark.name used for the last scored txn_id
+
+BATCH_SIZE = 5000  # rows per streamed batch
+
+LATEST_UPSERT = """
+    ON DUPLICATE KEY UPDATE anomaly_score=VALUES(anomaly_score), flagged=VALUES(flagged),
+                            reason=VALUES(reason), model_version=VALUES(model_version),
+                            scored_at=CURRENT_TIMESTAMP"""
+
+TXN_SELECT = """
         SELECT t.txn_id, t.account_id, t.amount, t.channel, t.location, t.txn_time,
-               a.customer_id, c.region
-        FROM Transaction t
+               t.txn_type, t.counterparty_account, a.customer_id, c.region
+        FROM {source}
         JOIN Account a ON a.account_id = t.account_id
         JOIN Customer c ON c.customer_id = a.customer_id
-        ORDER BY t.txn_time DESC
-        LIMIT %s
-        """
-        df = pd.read_sql(q, conn, params=(limit,))
+"""
+
+# always the oldest pending entries: one that commits late is claimed on the next poll
+OUTBOX_CLAIM_SQL = "SELECT outbox_id, txn_id FROM ScoringOutbox ORDER BY outbox_id LIMIT %s"
+# watermark source: entries at or below the watermark are scored either way
+OUTBOX_DRAIN_SQL = "DELETE FROM ScoringOutbox WHERE txn_id <= %s"
+
+def txn_query(after_id=0, limit=None, recent=None):
+    """
+    SQL + params for the scoring join, always in txn_id order: either the
+    `recent` latest transactions by txn_time, or rows above after_id.
+    """
+    if recent is not None:
+        q = TXN_SELECT.format(source="""(SELECT txn_id FROM Transaction ORDER BY txn_time DESC LIMIT %s) w
+        JOIN Transaction t ON t.txn_id = w.txn_id""")
+        params = [recent]
+    else:
+        q = TXN_SELECT.format(source="Transaction t") + """
+        WHERE t.txn_id > %s"""
+        params = [after_id]
+    q += """
+        ORDER BY t.txn_id"""
+    if limit is not None:
+        q += """
+        LIMIT %s"""
+        params.append(limit)
+    return q, params
+
+def between_query(ranges):
+    """SQL + params for the scoring join over the inclusive txn_id (lo, hi) ranges, in txn_id order."""
+    q = TXN_SELECT.format(source="Transaction t") + f"""
+        WHERE {' OR '.join(['t.txn_id BETWEEN %s AND %s'] * len(ranges))}
+        ORDER BY t.txn_id"""
+    return q, [v for r in ranges for v in r]
+
+def iter_txns(after_id=0, limit=None, recent=None, batch_size=BATCH_SIZE):
+    """
+    Stream the scoring join as DataFrame batches of at most batch_size rows.
+
+    Uses an unbuffered cursor, so rows stay on the server until fetched and
+    memory is bounded by one batch however large the window is.
+    """
+    import pandas as pd
+    q, params = txn_query(after_id, limit, recent)
+    with get_conn() as conn:
+        cur = conn.cursor(buffered=False)
+        cur.execute(q, params)
+        cols = [d[0] for d in cur.description]
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=cols)
+
+def fetch_recent_txns(limit=20000):
+    import pandas as pd
+    q, params = txn_query(recent=limit)
+    with get_conn() as conn:
+        df = pd.read_sql(q, conn, params=params)
     return df
 
-def featurize(df: pd.DataFrame):
-    df = df.copy()
-    # Encode simple features
-    df["channel_code"] = df["channel"].astype("category").cat.codes
-    df["region_code"] = df["region"].astype("category").cat.codes
-    # Per-account stats
-    grp = df.groupby("account_id")["amount"]
-    df["z_by_account"] = (df["amount"] - grp.transform("mean")) / (grp.transform("std").replace(0,1))
-    X = df[["amount","channel_code","region_code","z_by_account"]].fillna(0).to_numpy()
+def fetch_txns_after(after_id, limit=20000):
+    """Transactions above the high-water mark, oldest first."""
+    import pandas as pd
+    q, params = txn_query(after_id, limit)
+    with get_conn() as conn:
+        df = pd.read_sql(q, conn, params=params)
+    return df
+
+def fetch_txns_between(ranges, chunk=100):
+    """Transactions with txn_id in any of the inclusive (lo, hi) ranges, oldest first."""
+    import pandas as pd
+    frames = []
+    with get_conn() as conn:
+        for start in range(0, len(ranges), chunk):
+            q, params = between_query(ranges[start:start + chunk])
+            frames.append(pd.read_sql(q, conn, params=params))
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+class TxnCursor:
+    """
+    Forward scan over Transaction by txn_id that does not lose late commits.
+
+    txn_ids are handed out at INSERT time, so a posting whose transaction
+    commits late becomes visible below ids the scan has already passed.
+    Every id range the scan steps over is kept as a gap and re-read on each
+    fetch until its rows turn up or it is `grace` seconds old (ids of
+    rolled-back inserts never turn up). safe_point() -- every txn_id at or
+    below it has been read -- is what gets persisted as the watermark, so a
+    restart re-reads at most the rows between it and the scan position.
+    """
+
+    def __init__(self, start=0, grace=GAP_GRACE):
+        self.high = int(start)  # highest txn_id read
+        self.gaps = []          # [(lo, hi, first seen)] unread id ranges below high, ascending
+        self.grace = grace
+
+    def safe_point(self):
+        return self.gaps[0][0] - 1 if self.gaps else self.high
+
+    def _advance(self, ids, now):
+        prev = self.high
+        for i in ids:
+            if i > prev + 1:
+                self.gaps.append((prev + 1, i - 1, now))
+            prev = i
+        self.high = max(self.high, prev)
+
+    def _fill(self, ids, now):
+        # split each gap around the late rows found in it; expired gaps are given up on
+        kept = []
+        for lo, hi, since in self.gaps:
+            if now - since > self.grace:
+                continue
+            j = bisect_left(ids, lo)
+            while j < len(ids) and ids[j] <= hi:
+                if ids[j] > lo:
+                    kept.append((lo, ids[j] - 1, since))
+                lo = ids[j] + 1
+                j += 1
+            if lo <= hi:
+                kept.append((lo, hi, since))
+        self.gaps = kept
+
+    def fetch(self, limit=20000):
+        """(rows that turned up in gaps + up to `limit` rows above the scan position, backlog remains)."""
+        import pandas as pd
+        now = time.monotonic()
+        frames = []
+        if self.gaps:
+            late = fetch_txns_between([(lo, hi) for lo, hi, _ in self.gaps])
+            self._fill(late["txn_id"].tolist(), now)
+            frames.append(late)
+        # idle polls are a single MAX(txn_id) lookup (plus the gap re-read while gaps are open)
+        backlog = False
+        if latest_txn_id() > self.high:
+            new = fetch_txns_after(self.high, limit)
+            self._advance(new["txn_id"].tolist(), now)
+            frames.append(new)
+            backlog = len(new) == limit
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return None, backlog
+        if len(frames) == 1:
+            return frames[0], backlog
+        return pd.concat(frames).sort_values("txn_id", ignore_index=True), backlog
+
+def fetch_outbox_txns(limit=20000, in_flight=frozenset()):
+    """
+    Claim up to `limit` of the oldest pending ScoringOutbox entries, passing
+    over those in `in_flight` (claimed, not yet acked). Returns (txns, claimed
+    outbox_ids, backlog remains); txns is None when nothing is pending.
+    """
+    import pandas as pd
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute(OUTBOX_CLAIM_SQL, (limit + len(in_flight) + 1,))  # one extra row tells if more are pending
+        entries = [(int(o), int(t)) for o, t in cur.fetchall() if int(o) not in in_flight]
+        backlog = len(entries) > limit
+        entries = entries[:limit]
+        if not entries:
+            return None, [], False
+        ids = sorted({int(txn_id) for _, txn_id in entries})
+        q = TXN_SELECT.format(source="Transaction t") + f"""
+        WHERE t.txn_id IN ({','.join(['%s'] * len(ids))})
+        ORDER BY t.txn_id"""
+        df = pd.read_sql(q, conn, params=ids)
+    return df, [o for o, _ in entries], backlog
+
+def outbox_ack(outbox_ids, chunk=1000):
+    """Statements that retire exactly the claimed outbox entries; run with the score write."""
+    ids = list(outbox_ids)
+    return [(f"DELETE FROM ScoringOutbox WHERE outbox_id IN ({','.join(['%s'] * len(part))})", part)
+            for part in (ids[i:i + chunk] for i in range(0, len(ids), chunk))]
+
+def latest_txn_id():
+    # PK lookup only; this is the whole cost of an idle daemon cycle
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(MAX(txn_id), 0) FROM Transaction")
+        return int(cur.fetchone()[0])
+
+def load_watermark(name=WATERMARK):
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT last_id FROM Watermark WHERE name=%s", (name,))
+        row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+def featurize(df: pd.DataFrame, stats=None, update=True, out=None, windows=None, graph=None):
+    """Returns (df, X): X is the encoder's float32 matrix (written into `out` if given)."""
+    stats = stats if stats is not None else account_stats
+    windows = windows if windows is not None else velocity
+    graph = graph if graph is not None else transfer_graph
+    # Per-account stats from the persisted running store (O(1) per row, batch independent)
+    z = stats.zscores(df, update=update)
+    df["z_by_account"] = z  # kept on the frame for score reasons; no frame copy
+    # 1h / 24h velocity from the in-memory ring buffers (O(1) amortized per row)
+    V = windows.features(df)
+    # fan-in/out, rings and 2-hop amounts from the transfer graph, once the batch's transfers are in
+    G = graph.features(df)
+    X = encoder.transform(df, z, V, G, out)
     return df, X
 
-def score_and_write(df, scores):
+def fit_model(X):
+    """Fit IsolationForest; also return the training score range used to normalize later batches."""
+    from sklearn.ensemble import IsolationForest
+    clf = IsolationForest(n_estimators=200, contamination=0.03, random_state=42)
+    clf.fit(X)
+    train = -clf.decision_function(X)
+    return clf, (float(train.min()), float(train.max()))
+
+def train_model(limit=20000):
+    """Fit on the most recent window; returns (clf, bounds, n_rows, layout) or None when there is no data."""
+    # stream the window straight into one float32 matrix; the joined frame is never held whole
+    ensure_graph()  # graph features describe the network as it stands, for old and new rows alike
+    X = encoder.alloc(limit)
+    n = 0
+    windows = VelocityStore()  # replay the window's own history, not the live (already advanced) state
+    for df in iter_txns(recent=limit):
+        featurize(df, update=False, out=X[n:n + len(df)], windows=windows)
+        n += len(df)
+    if n == 0:
+        return None
+    clf, bounds = fit_model(X[:n])
+    return clf, bounds, n, encoder.signature()
+
+def ensure_graph():
+    if not transfer_graph.ready:
+        transfer_graph.rebuild()  # in memory only: load the transfer history once per process
+
+def load_model():
+    """Model bundle from the registry, trained and published on first use."""
+    if account_stats.is_empty():
+        # first start: seed running stats from history so z-scores are meaningful immediately
+        account_stats.rebuild(latest_txn_id())
+    if not velocity.ready:
+        velocity.rebuild()  # velocity windows live in memory only: replay the last 24h once per process
+    ensure_graph()
+    return registry.warm_start(train_model, encoder.signature())
+
+def normalize_scores(scores, bounds=None):
+    """Map raw anomaly scores to [0, 1] using the model's training range (or the batch's own)."""
+    import numpy as np
+    scores = np.asarray(scores, dtype=float)
+    lo, hi = bounds if bounds is not None else (scores.min(), scores.max())
+    if hi - lo == 0:
+        return np.zeros_like(scores)
+    return np.clip((scores - lo) / (hi - lo), 0.0, 1.0)
+
+def score_and_write(df, scores, bundle=None, watermark=None, batch_size=WRITE_BATCH, final=()):
+    import numpy as np
     # IsolationForest returns negative scores for anomalies; invert to make higher=more suspicious
-    norm = (scores.min(), scores.max())
-    if norm[1] - norm[0] == 0:
-        proba = np.zeros_like(scores)
-    else:
-        proba = (scores - norm[0]) / (norm[1] - norm[0])
+    proba = normalize_scores(scores, bundle["bounds"] if bundle is not None else None)
 
     flagged = proba > 0.65  # threshold (tunable)
     reasons = np.where(df["z_by_account"].abs() > 2.5, "Amount z-score high", "IForest anomaly")
-    rows = list(zip(df["txn_id"].tolist(), proba.tolist(), flagged.tolist(), reasons.tolist()))
+    version = bundle["version"] if bundle is not None else None
+    rows = [(txn_id, p, f, r, version) for txn_id, p, f, r in
+            zip(df["txn_id"].tolist(), proba.tolist(), flagged.tolist(), reasons.tolist())]
 
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.executemany(
-            "INSERT INTO FraudScore (txn_id, anomaly_score, flagged, reason) VALUES (%s,%s,%s,%s)",
-            rows
-        )
+    # bookkeeping (watermark, outbox ack) commits in the same transaction as the last batch of scores
+    final = list(final)
+    if watermark is not None:
+        final.append((
+            """INSERT INTO Watermark (name, last_id) VALUES (%s,%s)
+               ON DUPLICATE KEY UPDATE last_id = GREATEST(last_id, VALUES(last_id))""",
+            (WATERMARK, int(watermark))
+        ))
+        # postings enqueue for the outbox source either way; below the watermark they are scored
+        final.append((OUTBOX_DRAIN_SQL, (int(watermark),)))
+    # FraudScore keeps the full history; FraudScoreLatest is upserted so readers never scan it
+    bulk_insert("FraudScore", ["txn_id", "anomaly_score", "flagged", "reason", "model_version"],
+                rows, batch_size, final=final, also=[("FraudScoreLatest", LATEST_UPSERT)])
     return int(flagged.sum())
 
-def run_model():
-    df = fetch_recent_txns()
-    if df.empty:
-        return 0
+def score_batch(df, bundle, scorer=None):
+    """Featurize + score one batch, on the process pool when a ParallelScorer is given."""
+    if scorer is not None:
+        return scorer.score(df, bundle)
     df_f, X = featurize(df)
-    clf = IsolationForest(n_estimators=200, contamination=0.03, random_state=42)
-    clf.fit(X)
-    scores = -clf.decision_function(X)  # higher => more anomalous
-    flagged = score_and_write(df_f, scores)
+    scores = -bundle["model"].decision_function(X)  # higher => more anomalous
+    return df_f, scores
+
+def _batch_size(scorer):
+    # keep per-shard batches about BATCH_SIZE rows when scoring in parallel
+    return BATCH_SIZE * (scorer.workers if scorer is not None else 1)
+
+def run_model(limit=20000, scorer=None):
+    bundle = load_model()
+    if bundle is None:
+        return 0
+    flagged = 0
+    for df in iter_txns(recent=limit, batch_size=_batch_size(scorer)):
+        df_f, scores = score_batch(df, bundle, scorer)
+        account_stats.flush()
+        flagged += score_and_write(df_f, scores, bundle)
     return flagged
 
 if __name__ == "__main__":
-    n = run_model()
+    ap = argparse.ArgumentParser(description="Score the recent transaction window.")
+    ap.add_argument("--retrain", action="store_true",
+                    help="Fit and publish a new model version before scoring.")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Score on N processes, sharded by account_id (default 1 = in-process).")
+    args = ap.parse_args()
+    if args.retrain:
+        trained = train_model()
+        if trained is not None:
+            print(f"Published model {registry.publish(*trained)['version']}.")
+    scorer = None
+    if args.workers > 1:
+        from app.parallel_scoring import ParallelScorer
+        scorer = ParallelScorer(args.workers)
+    try:
+        n = run_model(scorer=scorer)
+    finally:
+        if scorer is not None:
+            scorer.close()
     print(f"Flagged {n} suspicious transactions.")
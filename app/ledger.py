@@ -0,0 +1,135 @@
+import argparse
+import csv
+from datetime import datetime
+from typing import Dict, Tuple
+
+from app.bulk_writer import WRITE_BATCH
+from app.db import get_conn
+from app.notify import notify_new_txns
+
+TXN_COLUMNS = ["account_id", "txn_time", "txn_type", "amount", "counterparty_account", "channel", "location"]
+POSTING_TYPES = ("DEPOSIT", "WITHDRAW", "TRANSFER")
+CHANNELS = ("BRANCH", "ATM", "ONLINE", "MOBILE")
+
+def balance_update(balance_deltas: Dict[int, float]) -> Tuple[str, list]:
+    """One UPDATE ... CASE statement applying every account's delta."""
+    ids = list(balance_deltas)
+    sql = ("UPDATE Account SET balance = balance + CASE account_id "
+           + " ".join(["WHEN %s THEN %s"] * len(ids))
+           + f" END WHERE account_id IN ({','.join(['%s'] * len(ids))})")
+    params = [v for acc_id in ids for v in (acc_id, balance_deltas[acc_id])] + ids
+    return sql, params
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def expand(postings, now=None):
+    """
+    Transaction rows (TXN_COLUMNS order) for a list of posting dicts:
+    account_id, txn_type (DEPOSIT / WITHDRAW / TRANSFER), amount,
+    counterparty_account (TRANSFER only), optional channel (default
+    BRANCH), location (default 'Local') and txn_time (default now). A transfer becomes TRANSFER_OUT + TRANSFER_IN rows.
+    """
+    now = now or datetime.now().replace(microsecond=0)
+    rows = []
+    for i, p in enumerate(postings):
+        kind, amount = p["txn_type"], float(p["amount"])
+        channel, location = p.get("channel") or "BRANCH", p.get("location") or "Local"
+        when = p.get("txn_time") or now
+        if kind not in POSTING_TYPES or channel not in CHANNELS or not amount > 0:
+            raise ValueError(f"Posting {i}: invalid {p}")
+        src = int(p["account_id"])
+        if kind == "TRANSFER":
+            dst = int(p["counterparty_account"])
+            if dst == src:
+                raise ValueError(f"Posting {i}: transfer to the same account")
+            rows.append((src, when, "TRANSFER_OUT", amount, dst, channel, location))
+            rows.append((dst, when, "TRANSFER_IN", amount, src, channel, location))
+        else:
+            rows.append((src, when, kind, amount, None, channel, location))
+    return rows
+
+def post_many(postings, enqueue=True, batch_size=WRITE_BATCH):
+    """
+    Apply a batch of postings (see expand) atomically, in one transaction:
+
+    1. lock every touched account with SELECT ... FOR UPDATE, in ascending
+       account_id order, so concurrent batches cannot deadlock each other
+    2. check postings in order against the running balance (ValueError and
+       nothing written if one would overdraw or an account is missing)
+    3. one UPDATE ... CASE per batch_size accounts for the summed deltas
+    4. multi-row INSERTs of the Transaction rows, plus their ScoringOutbox
+       entries when `enqueue`
+
+    Returns the new txn_ids in row order. Postings are not pre-authorized
+    one by one; the scoring daemon picks them up from the outbox.
+    """
+    rows = expand(postings)
+    if not rows:
+        return []
+    accounts = sorted({r[0] for r in rows})
+    row_sql = "(" + ",".join(["%s"] * len(TXN_COLUMNS)) + ")"
+    txn_ids = []
+    with get_conn() as conn:
+        conn.start_transaction()
+        try:
+            cur = conn.cursor()
+            balance = {}
+            for ids in _chunks(accounts, batch_size):
+                cur.execute(f"""SELECT account_id, balance FROM Account
+                                WHERE account_id IN ({','.join(['%s'] * len(ids))})
+                                ORDER BY account_id FOR UPDATE""", ids)
+                balance.update((int(a), float(b)) for a, b in cur.fetchall())
+            missing = [a for a in accounts if a not in balance]
+            if missing:
+                raise ValueError(f"Unknown account(s): {missing[:10]}")
+
+            deltas = dict.fromkeys(accounts, 0.0)
+            for r in rows:
+                account_id, kind, amount = r[0], r[2], r[3]
+                signed = amount if kind in ("DEPOSIT", "TRANSFER_IN") else -amount
+                if signed < 0 and balance[account_id] + deltas[account_id] < amount:
+                    raise ValueError(f"Insufficient funds in account {account_id}")
+                deltas[account_id] += signed
+
+            changed = {a: round(d, 2) for a, d in deltas.items() if d}
+            for ids in _chunks(list(changed), batch_size):
+                cur.execute(*balance_update({a: changed[a] for a in ids}))
+
+            for chunk in _chunks(rows, batch_size):
+                cur.execute(f"INSERT INTO Transaction ({', '.join(TXN_COLUMNS)}) VALUES "
+                            + ",".join([row_sql] * len(chunk)), [v for row in chunk for v in row])
+                # a multi-row INSERT gets consecutive ids; lastrowid is the first one
+                first = cur.lastrowid
+                ids = list(range(first, first + len(chunk)))
+                if enqueue:
+                    cur.execute("INSERT INTO ScoringOutbox (txn_id) VALUES " + ",".join(["(%s)"] * len(ids)), ids)
+                txn_ids += ids
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if enqueue:
+        notify_new_txns()
+    return txn_ids
+
+def read_postings(path):
+    """Postings from a CSV file with a header row of posting keys (see expand)."""
+    with open(path, newline="") as f:
+        return [{k: v for k, v in row.items() if v not in ("", None)} for row in csv.DictReader(f)]
+
+def main():
+    ap = argparse.ArgumentParser(description="Post a CSV batch feed to the ledger.")
+    ap.add_argument("csv", help="Header: account_id,txn_type,amount[,counterparty_account,channel,location,txn_time]")
+    ap.add_argument("--batch", type=int, default=WRITE_BATCH,
+                    help="Postings per transaction; each batch commits (or fails) as a whole.")
+    args = ap.parse_args()
+    postings = read_postings(args.csv)
+    posted = 0
+    for batch in _chunks(postings, args.batch):
+        posted += len(post_many(batch))
+    print(f"✓ Posted {len(postings)} postings ({posted} transaction rows).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import pickle
+import threading
+from datetime import datetime
+from pathlib import Path
+
+MODEL_DIR = Path(os.getenv("MODEL_DIR", "models"))
+RETRAIN_SECS = int(os.getenv("MODEL_RETRAIN_SECS", "3600"))  # background retrain period
+
+class ModelRegistry:
+    """
+    Versioned IsolationForest artifacts on local disk.
+
+    Each version is written to model-v<N>.pkl and then published by
+    atomically replacing the LATEST pointer file, so a reader never sees a
+    half-written model. Version numbers are claimed by creating the file
+    exclusively, so processes publishing at once never share one. The in-memory bundle is swapped under a lock, which
+    lets a background retrain replace the model while scoring continues.
+    """
+
+    def __init__(self, model_dir=MODEL_DIR):
+        self.model_dir = Path(model_dir)
+        self._lock = threading.Lock()
+        self._current = None
+
+    def current(self):
+        with self._lock:
+            return self._current
+
+    def versions(self):
+        return sorted(int(p.stem.split("-v")[1]) for p in self.model_dir.glob("model-v*.pkl"))
+
+    def load_latest(self):
+        pointer = self.model_dir / "LATEST"
+        if not pointer.exists():
+            return None
+        with open(self.model_dir / pointer.read_text().strip(), "rb") as f:
+            bundle = pickle.load(f)
+        with self._lock:
+            self._current = bundle
+        return bundle
+
+    def _claim(self):
+        """Reserve the next free version number by creating its file exclusively; (n, open file)."""
+        n = max(self.versions(), default=0) + 1
+        while True:
+            try:
+                # another process publishing at the same time gets FileExistsError and moves on to n+1
+                return n, open(self.model_dir / f"model-v{n}.pkl", "xb")
+            except FileExistsError:
+                n += 1
+
+    def publish(self, clf, bounds, n_train, features=None):
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            n, claimed = self._claim()
+            bundle = {
+                "version": f"v{n}",
+                "model": clf,
+                "bounds": bounds,
+                "n_train": int(n_train),
+                "features": features,
+                "trained_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            name = f"model-v{n}.pkl"
+            try:
+                with claimed as f:
+                    pickle.dump(bundle, f)
+            except BaseException:
+                os.unlink(self.model_dir / name)
+                raise
+            # LATEST only moves forward: a slower publisher of a lower version leaves it alone
+            pointer = self.model_dir / "LATEST"
+            if not pointer.exists() or int(pointer.read_text().strip()[len("model-v"):-len(".pkl")]) < n:
+                tmp = self.model_dir / f"LATEST.{os.getpid()}.tmp"
+                tmp.write_text(name)
+                os.replace(tmp, pointer)
+            self._current = bundle
+        return bundle
+
+    def warm_start(self, train_fn, features=None):
+        """
+        Load the latest artifact, training and publishing a new version only if
+        none exists yet or it was trained on a different feature layout.
+        """
+        bundle = self.current() or self.load_latest()
+        if bundle is None or (features is not None and bundle.get("features") != features):
+            trained = train_fn()
+            bundle = self.publish(*trained) if trained is not None else None
+        return bundle
+
+    def start_retraining(self, train_fn, every=RETRAIN_SECS):
+        """Retrain every `every` seconds on a daemon thread; returns the stop Event."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(every):
+                try:
+                    trained = train_fn()
+                    if trained is not None:
+                        bundle = self.publish(*trained)
+                        print(f"Model {bundle['version']} published ({bundle['n_train']} rows).")
+                except Exception as e:
+                    print(f"Retrain failed, keeping current model: {e}")
+
+        threading.Thread(target=loop, name="model-retrain", daemon=True).start()
+        return stop
+
+registry = ModelRegistry()
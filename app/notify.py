@@ -0,0 +1,34 @@
+import asyncio
+import os
+import socket
+
+# Loopback UDP works on every platform the CLIs run on (no AF_UNIX datagrams on Windows)
+WAKE_ADDR = ("127.0.0.1", int(os.getenv("SCORING_WAKE_PORT", "50555")))
+
+def notify_new_txns():
+    """
+    Best-effort wake-up for the scoring daemon after a posting commits.
+    A lost datagram only means the work waits for the daemon's next poll.
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b"1", WAKE_ADDR)
+    except OSError:
+        pass
+
+class _WakeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, event):
+        self.event = event
+
+    def datagram_received(self, data, addr):
+        self.event.set()
+
+async def listen_for_wakeups(event):
+    """Set `event` whenever a notification arrives; returns the transport, or None if the port is taken."""
+    loop = asyncio.get_running_loop()
+    try:
+        transport, _ = await loop.create_datagram_endpoint(lambda: _WakeProtocol(event), local_addr=WAKE_ADDR)
+    except OSError as e:
+        print(f"Wake-up listener unavailable ({e}); relying on polling.")
+        return None
+    return transport
@@ -0,0 +1,193 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from app.account_stats import account_stats
+from app.features import encoder
+from app.model_registry import registry
+from app.transfer_graph import transfer_graph
+from app.velocity import velocity
+
+PREAUTH_ENABLED = os.getenv("PREAUTH_ENABLED", "0") == "1"
+HOLD_AT = float(os.getenv("PREAUTH_HOLD_AT", "0.80"))      # normalized score that holds a posting
+REJECT_AT = float(os.getenv("PREAUTH_REJECT_AT", "0.95"))  # normalized score that rejects it
+BUDGET_MS = float(os.getenv("PREAUTH_BUDGET_MS", "5"))     # past this the posting goes through unscored
+
+REGION_SQL = """SELECT c.region FROM Account a JOIN Customer c ON c.customer_id = a.customer_id
+                WHERE a.account_id=%s"""
+
+class TransactionHeld(ValueError):
+    def __init__(self, score):
+        super().__init__(f"Transaction held for review (score {score:.2f}).")
+        self.score = score
+
+class TransactionRejected(ValueError):
+    def __init__(self, score):
+        super().__init__(f"Transaction rejected by fraud check (score {score:.2f}).")
+        self.score = score
+
+def _avg_path_length(n):
+    # c(n) from the Isolation Forest paper: expected path length of an unsuccessful BST search
+    import numpy as np
+    n = np.asarray(n, dtype=float)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+class CompiledForest:
+    """
+    A fitted IsolationForest flattened into padded (n_trees, n_nodes) arrays.
+
+    Scoring one row walks all trees at once, one vectorized step per level,
+    instead of going through sklearn's per-estimator validation and
+    decision_path machinery; the result equals -clf.decision_function(x).
+    """
+
+    def __init__(self, clf):
+        import numpy as np
+        trees = [e.tree_ for e in clf.estimators_]
+        n_trees, width = len(trees), max(t.node_count for t in trees)
+        self.left = np.full((n_trees, width), -1, dtype=np.int64)
+        self.right = np.full((n_trees, width), -1, dtype=np.int64)
+        self.feature = np.zeros((n_trees, width), dtype=np.int64)
+        self.threshold = np.zeros((n_trees, width))
+        self.leaf_value = np.zeros((n_trees, width))
+        max_depth = 0
+        for i, (t, feats) in enumerate(zip(trees, clf.estimators_features_)):
+            n = t.node_count
+            left, right = t.children_left, t.children_right
+            internal = left != -1
+            feat = np.zeros(n, dtype=np.int64)
+            feat[internal] = np.asarray(feats)[t.feature[internal]]  # tree-local -> global column
+            depth = np.zeros(n)
+            for node in range(n):  # children always get larger ids than their parent
+                if internal[node]:
+                    depth[left[node]] = depth[right[node]] = depth[node] + 1
+            self.left[i, :n], self.right[i, :n] = left, right
+            self.feature[i, :n], self.threshold[i, :n] = feat, t.threshold
+            self.leaf_value[i, :n] = depth + _avg_path_length(t.n_node_samples)
+            max_depth = max(max_depth, int(depth.max()))
+        self.max_depth = max_depth
+        self.rows = np.arange(n_trees)
+        self.norm = float(_avg_path_length([clf.max_samples_])[0])
+        self.offset = float(clf.offset_)
+
+    def raw_score(self, x):
+        import numpy as np
+        node = np.zeros(len(self.rows), dtype=np.int64)
+        for _ in range(self.max_depth):
+            f = self.feature[self.rows, node]
+            nxt = np.where(x[f] <= self.threshold[self.rows, node],
+                           self.left[self.rows, node], self.right[self.rows, node])
+            node = np.where(nxt == -1, node, nxt)  # leaves stay put
+        score_samples = -2.0 ** (-self.leaf_value[self.rows, node].mean() / self.norm)
+        return -(score_samples - self.offset)
+
+class PreAuthScorer:
+    """
+    Inline fraud check for withdraw/transfer, run before the balance update.
+
+    Uses the registry's preloaded model (compiled once per version), the
+    in-memory account stats, velocity windows and transfer graph, so a warm
+    check does no DB work. Each check runs against a deadline: if it misses the budget the
+    posting proceeds and the transaction is scored later by the daemon as usual.
+    """
+
+    def __init__(self, budget_ms=BUDGET_MS, hold_at=HOLD_AT, reject_at=REJECT_AT):
+        self.budget_s = budget_ms / 1000.0
+        self.hold_at, self.reject_at = hold_at, reject_at
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="preauth")
+        self._forest = None
+        self._version = None
+        self._bounds = None
+        self._regions = {}
+        self.latencies_ms = deque(maxlen=10000)
+        self.timeouts = 0
+
+    def warm(self):
+        """
+        Load the published model and the in-memory feature state. Read-only:
+        never trains, publishes or rebuilds AccountStats (the daemon does), so
+        without a usable model every check fails open.
+        """
+        from app.fraud_model import ensure_graph
+        bundle = registry.current() or registry.load_latest()
+        if bundle is None or bundle.get("features") != encoder.signature():
+            return self
+        if not velocity.ready:
+            velocity.rebuild()
+        ensure_graph()
+        if bundle["version"] != self._version:
+            self._forest = CompiledForest(bundle["model"])
+            self._version, self._bounds = bundle["version"], bundle["bounds"]
+        return self
+
+    def region_of(self, cur, account_id):
+        """
+        The account's region, read on the caller's cursor before the check's
+        budget starts; its running stats are loaded here too, so the check
+        itself never touches the database.
+        """
+        account_stats.load([account_id], cur)
+        if account_id not in self._regions:
+            cur.execute(REGION_SQL, (account_id,))
+            row = cur.fetchone()
+            self._regions[account_id] = row[0] if row else None
+        return self._regions[account_id]
+
+    def _score(self, account_id, amount, channel, region):
+        from app.fraud_model import normalize_scores
+        z = account_stats.preview_zscore(account_id, amount)
+        x = encoder.encode_one(amount, channel, region, z, velocity.preview(account_id, amount, channel),
+                               transfer_graph.account_features(account_id))
+        return float(normalize_scores(self._forest.raw_score(x), self._bounds))
+
+    def fold(self, txn_id, account_id, amount, channel, location=None):
+        """Fold a committed posting into the state the next check reads (the daemon persists it)."""
+        account_stats.load([account_id])
+        account_stats.update(int(account_id), int(txn_id), float(amount))
+        velocity.fold(account_id, txn_id, amount, channel, location)
+
+    def check(self, account_id, amount, channel, region):
+        """Normalized score in [0, 1], or None if there is no model or the budget ran out."""
+        if self._forest is None:
+            return None
+        account_stats.load([int(account_id)])  # no-op after region_of(); kept off the clock either way
+        start = time.perf_counter()
+        future = self._executor.submit(self._score, int(account_id), float(amount), channel, region)
+        try:
+            score = future.result(timeout=self.budget_s)
+        except FutureTimeout:
+            self.timeouts += 1
+            score = None
+        self.latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        return score
+
+    def enforce(self, account_id, amount, channel, region):
+        score = self.check(account_id, amount, channel, region)
+        if score is None:
+            return None  # fail open: the async path scores it after posting
+        if score >= self.reject_at:
+            raise TransactionRejected(score)
+        if score >= self.hold_at:
+            raise TransactionHeld(score)
+        return score
+
+    def stats(self):
+        import numpy as np
+        lat = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {"checks": len(self.latencies_ms), "timeouts": self.timeouts,
+                "p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99))}
+
+_scorer = None
+
+def get_preauth():
+    """Shared, warmed scorer when PREAUTH_ENABLED=1; None otherwise."""
+    global _scorer
+    if not PREAUTH_ENABLED:
+        return None
+    if _scorer is None:
+        _scorer = PreAuthScorer().warm()
+    return _scorer
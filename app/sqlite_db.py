@@ -0,0 +1,204 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+SCHEMA = Path(__file__).resolve().parent.parent / "db" / "schema_sqlite.sql"
+# translated statements kept; IN-lists and multi-row VALUES make one per length
+TRANSLATE_CACHE = int(os.getenv("SQLITE_TRANSLATE_CACHE", "1024"))
+
+# MySQL-dialect fragments the app uses -> SQLite equivalents
+_REWRITES = [
+    (re.compile(r"(?<![\"\w])Transaction(?![\"\w])"), '"Transaction"'),  # keyword in SQLite
+    (re.compile(r"\s+FOR\s+UPDATE\b", re.I), ""),  # BEGIN IMMEDIATE already holds the write lock
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", re.I), ""),  # column option in migration DDL
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now', 'localtime')"),
+    # MySQL's CURRENT_TIMESTAMP is local time, SQLite's is UTC; a column default needs parentheses
+    (re.compile(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", re.I), "DEFAULT (datetime('now', 'localtime'))"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b", re.I), "datetime('now', 'localtime')"),
+    (re.compile(r"\bRAND\(\)", re.I), "(random() / 18446744073709551616.0 + 0.5)"),
+    (re.compile(r"\bGREATEST\(", re.I), "MAX("),
+    (re.compile(r"\bLEAST\(", re.I), "MIN("),
+    (re.compile(r"\bSTART\s+TRANSACTION\b", re.I), "BEGIN IMMEDIATE"),
+]
+_UPSERT = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.I)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.I)
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:OR\s+IGNORE\s+)?INTO\s+\"?(\w+)\"?", re.I)
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("TIMESTAMP", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+
+class Dialect:
+    """
+    Rewrites the MySQL statements used across the app into SQLite, once per
+    distinct statement: %s placeholders, FOR UPDATE, ON UPDATE CURRENT_TIMESTAMP
+    (migration DDL), INSERT IGNORE, NOW() and CURRENT_TIMESTAMP (as local
+    time), RAND(), GREATEST/LEAST, and
+    ON DUPLICATE KEY UPDATE col=VALUES(col) as
+    ON CONFLICT(<primary key>) DO UPDATE SET col=excluded.col. Only the
+    TRANSLATE_CACHE most recently used translations are kept.
+    """
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._pk = {}
+        self._lock = threading.Lock()
+
+    def _primary_key(self, raw, table):
+        if table not in self._pk:
+            cols = raw.execute(f'PRAGMA table_info("{table}")').fetchall()
+            self._pk[table] = [c[1] for c in sorted(cols, key=lambda c: c[5]) if c[5]]
+        return self._pk[table]
+
+    def translate(self, raw, sql):
+        with self._lock:
+            out = self._cache.get(sql)
+            if out is not None:
+                self._cache.move_to_end(sql)
+                return out
+            out = sql.replace("%s", "?").replace("%%", "%")
+            for pattern, repl in _REWRITES:
+                out = pattern.sub(repl, out)
+            head, *tail = _UPSERT.split(out, maxsplit=1)
+            if tail:
+                table = _INSERT_TABLE.match(head).group(1)
+                target = ", ".join(self._primary_key(raw, table))
+                updates = _VALUES_REF.sub(r"excluded.\1", tail[0])
+                out = f"{head}ON CONFLICT({target}) DO UPDATE SET{updates}"
+            self._cache[sql] = out
+            if len(self._cache) > TRANSLATE_CACHE:
+                self._cache.popitem(last=False)
+            return out
+
+dialect = Dialect()
+
+class SQLiteCursor:
+    """mysql.connector-style cursor: %s params, dictionary rows, MySQL lastrowid semantics."""
+
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cur = conn.raw.cursor()
+        self._dictionary = dictionary
+        self.lastrowid = None
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    @property
+    def rowcount(self):
+        return self._cur.rowcount
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def _track_insert(self, sql, last_id):
+        # MySQL reports the FIRST id of a multi-row insert; SQLite reports the last
+        if _INSERT_TABLE.match(sql) and self._cur.rowcount > 0 and last_id:
+            self.lastrowid = last_id - self._cur.rowcount + 1
+
+    def execute(self, sql, params=()):
+        q = dialect.translate(self._conn.raw, sql)
+        self._cur.execute(q, tuple(params) if params is not None else ())
+        self._track_insert(q, self._cur.lastrowid)
+        return self
+
+    def executemany(self, sql, seq_params):
+        q = dialect.translate(self._conn.raw, sql)
+        self._cur.executemany(q, [tuple(p) for p in seq_params])
+        self._track_insert(q, self._conn.raw.execute("SELECT last_insert_rowid()").fetchone()[0])
+        return self
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cur.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cur.close()
+
+class SQLiteConnection:
+    """
+    In-process connection with the slice of the mysql.connector API the app
+    uses (cursor(dictionary=, buffered=), start_transaction, commit, rollback,
+    context manager). Autocommit unless start_transaction() was called, like
+    the MySQL connections from app.db; start_transaction takes SQLite's write
+    lock up front (BEGIN IMMEDIATE), which is what SELECT ... FOR UPDATE was for.
+    """
+
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self.raw.execute("PRAGMA journal_mode=WAL")  # readers never block the writer
+        self.raw.execute("PRAGMA synchronous=NORMAL")
+        self.raw.execute("PRAGMA foreign_keys=ON")
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SQLiteCursor(self, dictionary)
+
+    @property
+    def in_transaction(self):
+        return self.raw.in_transaction
+
+    def start_transaction(self):
+        self.raw.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self):
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        if self.raw is not None:
+            self.rollback()
+            self.raw.close()
+            self.raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+_ready = set()  # database files whose schema this process has already ensured
+_ready_lock = threading.Lock()
+
+def connect(path):
+    """Open the database file, creating any missing tables on first use in this process."""
+    conn = SQLiteConnection(path)
+    with _ready_lock:
+        if path not in _ready:
+            create_schema(conn)
+            _ready.add(path)
+    return conn
+
+def create_schema(conn):
+    # every statement is CREATE TABLE IF NOT EXISTS, so this is safe to repeat
+    conn.raw.executescript(SCHEMA.read_text())
@@ -0,0 +1,351 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from app.db import get_conn
+from app.folded import FoldedIds
+
+GRAPH_DAYS = int(os.getenv("TRANSFER_GRAPH_DAYS", "90"))  # history replayed into the graph on startup (0 = all)
+MAX_CYCLE = 4            # longest transfer ring looked for (accounts on the cycle)
+HOPS = 2                 # depth of the k-hop neighborhood amount sums
+MAX_FRONTIER = 10000     # nodes expanded per hop; bounds the cost of walking around hub accounts
+COMPACT_MIN = 50000      # buffered edges before a compaction is considered
+GRAPH_FEATURES = ("fan_in", "fan_out", "cycle_len", "in_amount_2hop", "out_amount_2hop")
+
+EDGES_SQL = """
+    SELECT txn_id, account_id, counterparty_account, amount
+    FROM Transaction
+    WHERE txn_type = 'TRANSFER_OUT' AND counterparty_account IS NOT NULL AND txn_time >= %s
+"""
+
+class _CSR:
+    """Unique edges grouped by one endpoint: row v is nbr[indptr[v]:indptr[v+1]], sorted by neighbor."""
+    __slots__ = ("indptr", "nbr", "amt", "cnt")
+
+    def __init__(self, indptr, nbr, amt, cnt):
+        self.indptr, self.nbr, self.amt, self.cnt = indptr, nbr, amt, cnt
+
+    @classmethod
+    def build(cls, keys, others, amounts, counts, n):
+        import numpy as np
+        order = np.lexsort((others, keys))
+        k, o, a, c = keys[order], others[order], amounts[order], counts[order]
+        if len(k):
+            first = np.ones(len(k), dtype=bool)
+            first[1:] = (k[1:] != k[:-1]) | (o[1:] != o[:-1])
+            starts = np.flatnonzero(first)  # repeated transfers between the same pair become one edge
+            k, o = k[starts], o[starts]
+            a, c = np.add.reduceat(a, starts), np.add.reduceat(c, starts)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(k, minlength=n), out=indptr[1:])
+        return cls(indptr, o.astype(np.int32), a.astype(np.float64), c.astype(np.int64))
+
+    def resize(self, n):
+        import numpy as np
+        extra = n + 1 - len(self.indptr)
+        if extra > 0:
+            self.indptr = np.concatenate([self.indptr, np.full(extra, self.indptr[-1])])
+
+    def has(self, v, u):
+        import numpy as np
+        row = self.nbr[self.indptr[v]:self.indptr[v + 1]]
+        i = np.searchsorted(row, u)
+        return i < len(row) and row[i] == u
+
+    def gather(self, nodes, origins=False):
+        """Neighbors of every node in `nodes`, concatenated (one vectorized gather); with origins, (node of each, neighbors)."""
+        import numpy as np
+        starts, ends = self.indptr[nodes], self.indptr[nodes + 1]
+        lens = ends - starts
+        if not lens.sum():
+            found = self.nbr[:0]
+        else:
+            offsets = np.repeat(starts - np.cumsum(lens) + lens, lens)
+            found = self.nbr[offsets + np.arange(lens.sum())]
+        return (np.repeat(nodes, lens), found) if origins else found
+
+    def expanded(self):
+        """(keys, others, amounts, counts) of every edge."""
+        import numpy as np
+        keys = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        return keys, self.nbr, self.amt, self.cnt
+
+class GraphFeatureTable:
+    """Precomputed GRAPH_FEATURES per account; what a scoring worker gets instead of the whole graph."""
+
+    def __init__(self, rows):
+        self.rows = rows  # account_id -> tuple of GRAPH_FEATURES
+
+    def features(self, df):
+        import numpy as np
+        zero = (0.0,) * len(GRAPH_FEATURES)
+        return np.array([self.rows.get(int(a), zero) for a in df["account_id"].tolist()],
+                        dtype=np.float32).reshape(len(df), len(GRAPH_FEATURES))
+
+class TransferGraph:
+    """
+    Directed transfer network (payer -> payee account) kept in memory.
+
+    Edges live in two CSR indexes (by payer and by payee) of unique account
+    pairs with summed amounts, plus an append buffer of pairs seen since the
+    last compaction; the buffer is merged in once it reaches a quarter of
+    the compacted size, so adding an edge is O(1) amortized. Per-account
+    fan-in / fan-out (distinct counterparties) and total amounts are kept
+    as flat arrays. Short-cycle and k-hop queries walk both parts with a
+    bounded frontier, so hub accounts cannot make a query unbounded.
+
+    The ring length, the one expensive feature, is cached per account. A
+    new payer -> payee pair can only change it for the accounts on a ring
+    it closes, so only those are dropped from the cache (on the next read).
+    Transfers are recognized by txn_id (see FoldedIds), so a replayed one
+    is never added twice and a late-committing one is still added.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._clear()
+
+    def _clear(self):
+        # arrays are allocated by the first _ensure(), so an unused graph never imports numpy
+        self.folded = FoldedIds()
+        self.n = 0  # account ids below n have a slot in every array
+        self._out = self._in = None
+        self._buf_out, self._buf_in, self._buffered = {}, {}, 0  # src -> {dst: [amount, count]} and reverse
+        self.fan_in = self.fan_out = self.amount_in = self.amount_out = None
+        self._rings, self._new_pairs = {}, []  # account_id -> cached ring length; pairs added since the last read
+
+    def _ensure(self, node):
+        import numpy as np
+        if node < self.n:
+            return
+        n = max(node + 1, 2 * self.n, 1024)
+        if self._out is None:
+            empty = np.zeros(0, dtype=np.int64)
+            self._out = _CSR.build(empty, empty, empty, empty, n)
+            self._in = _CSR.build(empty, empty, empty, empty, n)
+            self.fan_in, self.fan_out = np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int32)
+            self.amount_in, self.amount_out = np.zeros(n), np.zeros(n)
+        else:
+            for name in ("fan_in", "fan_out", "amount_in", "amount_out"):
+                old = getattr(self, name)
+                new = np.zeros(n, dtype=old.dtype)
+                new[:len(old)] = old
+                setattr(self, name, new)
+            self._out.resize(n)
+            self._in.resize(n)
+        self.n = n
+
+    def add(self, src, dst, amount):
+        """Record one transfer src -> dst."""
+        with self._lock:
+            self._ensure(max(src, dst))
+            self.amount_out[src] += amount
+            self.amount_in[dst] += amount
+            e = self._buf_out.get(src, {}).get(dst)
+            if e is not None:
+                e[0] += amount
+                e[1] += 1
+                return
+            if not self._out.has(src, dst):
+                self.fan_out[src] += 1
+                self.fan_in[dst] += 1
+                self._new_pairs.append((src, dst))
+            e = [amount, 1]
+            self._buf_out.setdefault(src, {})[dst] = e
+            self._buf_in.setdefault(dst, {})[src] = e
+            self._buffered += 1
+            if self._buffered >= max(COMPACT_MIN, len(self._out.nbr) // 4):
+                self.compact()
+
+    def compact(self):
+        """Merge the append buffer into the CSR indexes."""
+        import numpy as np
+        with self._lock:
+            if not self._buffered:
+                return
+            pairs = [(s, d, e[0], e[1]) for s, row in self._buf_out.items() for d, e in row.items()]
+            s, d, a, c = (np.array(col) for col in zip(*pairs))
+            ks, ko, ka, kc = self._out.expanded()
+            src, dst = np.concatenate([ks, s]), np.concatenate([ko, d])
+            amt, cnt = np.concatenate([ka, a]), np.concatenate([kc, c])
+            self._out = _CSR.build(src, dst, amt, cnt, self.n)
+            self._in = _CSR.build(dst, src, amt, cnt, self.n)
+            self._buf_out, self._buf_in, self._buffered = {}, {}, 0
+
+    def _step(self, nodes, outgoing):
+        """Distinct neighbors of `nodes` (both the compacted and the buffered edges)."""
+        import numpy as np
+        csr, buf = (self._out, self._buf_out) if outgoing else (self._in, self._buf_in)
+        found = csr.gather(nodes)
+        if buf:
+            extra = [u for v in nodes.tolist() if v in buf for u in buf[v]]
+            if extra:
+                found = np.concatenate([found, np.array(extra, dtype=found.dtype)])
+        return np.unique(found)
+
+    def _step_pairs(self, nodes, outgoing):
+        """(node, neighbor) for every edge out of (into) `nodes`, buffered ones included."""
+        import numpy as np
+        csr, buf = (self._out, self._buf_out) if outgoing else (self._in, self._buf_in)
+        origin, found = csr.gather(nodes, origins=True)
+        if buf:
+            extra = [(v, u) for v in nodes.tolist() if v in buf for u in buf[v]]
+            if extra:
+                o, f = np.array(extra, dtype=np.int64).T
+                origin, found = np.concatenate([origin, o]), np.concatenate([found, f])
+        return origin, found
+
+    def _neighbors(self, a, outgoing):
+        """Distinct payees (payers) of one account, sorted, as a CSR row already is."""
+        import numpy as np
+        csr, buf = (self._out, self._buf_out) if outgoing else (self._in, self._buf_in)
+        row = csr.nbr[csr.indptr[a]:csr.indptr[a + 1]]
+        extra = buf.get(a)
+        if extra:
+            add = np.fromiter(extra, dtype=row.dtype, count=len(extra))
+            i = np.minimum(np.searchsorted(row, add), max(len(row) - 1, 0))
+            add = add[row[i] != add] if len(row) else add  # buffered pairs are often repeats of compacted ones
+            if len(add):
+                row = np.sort(np.concatenate([row, add]))
+        return row[row != a]
+
+    def _levels(self, account_id, depth, outgoing):
+        """[accounts first reached after 1, 2, ... depth transfers] from account_id, frontier-capped."""
+        import numpy as np
+        frontier = self._neighbors(account_id, outgoing)[:MAX_FRONTIER]
+        levels = [frontier]
+        if depth > 1:
+            seen = np.union1d(frontier, [account_id])
+        for _ in range(depth - 1):
+            frontier = np.setdiff1d(self._step(frontier, outgoing), seen)[:MAX_FRONTIER]
+            levels.append(frontier)
+            if len(frontier):
+                seen = np.union1d(seen, frontier)
+        return levels
+
+    @staticmethod
+    def _cycle_len(forward, backward):
+        # shortest cycle through a = min over z of dist(a -> z) + dist(z -> a)
+        import numpy as np
+        best = 0
+        for i, f in enumerate(forward, 1):
+            for j, b in enumerate(backward, 1):
+                if i + j > MAX_CYCLE or (best and i + j >= best):
+                    continue
+                if np.intersect1d(f, b, assume_unique=True).size:
+                    best = i + j
+        return best
+
+    def _ring_len(self, a):
+        if not (self.fan_in[a] and self.fan_out[a]):
+            return 0
+        depth = (MAX_CYCLE + 1) // 2  # rings are found meeting in the middle
+        return self._cycle_len(self._levels(a, depth, outgoing=True), self._levels(a, depth, outgoing=False))
+
+    def _ring_members(self, src, dst):
+        """Accounts on a ring of up to MAX_CYCLE (4) accounts through src -> dst: a path dst -> src of <= 3 transfers."""
+        import numpy as np
+        if not (self.fan_out[dst] and self.fan_in[src]):
+            return set()
+        f1 = self._levels(dst, 1, outgoing=True)[0]
+        b1 = self._levels(src, 1, outgoing=False)[0]
+        # dst -> x -> src, and dst -> x -> y -> src via an edge from f1 into b1 (gathered from the smaller side)
+        if len(f1) <= len(b1):
+            x, y = self._step_pairs(f1, outgoing=True)
+            hit = np.isin(y, b1)
+        else:
+            y, x = self._step_pairs(b1, outgoing=False)
+            hit = np.isin(x, f1)
+        found = np.concatenate([np.intersect1d(f1, b1, assume_unique=True), x[hit], y[hit]])
+        if not len(found) and not np.isin(src, f1):  # not even dst -> src
+            return set()
+        return {src, dst}.union(found.tolist())
+
+    def account_features(self, account_id):
+        """
+        GRAPH_FEATURES for one account: distinct payers / payees, the shortest
+        transfer ring through it (up to MAX_CYCLE, 0 if none; a 2-cycle is
+        money sent straight back), and the total amount flowing into (out of)
+        it and the accounts within HOPS-1 transfers upstream (downstream).
+        """
+        a = int(account_id)
+        with self._lock:
+            if a >= self.n:
+                return (0.0,) * len(GRAPH_FEATURES)
+            if self._new_pairs:
+                if self._rings:
+                    for src, dst in self._new_pairs:
+                        for m in self._ring_members(src, dst):
+                            self._rings.pop(m, None)
+                self._new_pairs = []
+            cycle = self._rings.get(a)
+            if cycle is None:
+                cycle = self._rings[a] = self._ring_len(a)
+            up = self._levels(a, HOPS - 1, outgoing=False) if self.fan_in[a] else []
+            down = self._levels(a, HOPS - 1, outgoing=True) if self.fan_out[a] else []
+            in_sum = self.amount_in[a] + sum(self.amount_in[lv].sum() for lv in up)
+            out_sum = self.amount_out[a] + sum(self.amount_out[lv].sum() for lv in down)
+            return (float(self.fan_in[a]), float(self.fan_out[a]), float(cycle), float(in_sum), float(out_sum))
+
+    def fold(self, df):
+        """Add the batch's TRANSFER_OUT rows not folded in yet (a replayed batch adds nothing)."""
+        import numpy as np
+        with self._lock:
+            t = df[(df["txn_type"] == "TRANSFER_OUT") & df["counterparty_account"].notna()]
+            order = np.argsort(t["txn_id"].to_numpy(), kind="stable")
+            ids = t["txn_id"].to_numpy()[order].tolist()
+            src = t["account_id"].to_numpy()[order].tolist()
+            dst = t["counterparty_account"].to_numpy()[order].astype(np.int64).tolist()
+            amt = t["amount"].to_numpy(dtype=float)[order].tolist()
+            for i, s, d, a in zip(ids, src, dst, amt):
+                if self.folded.claim(int(i)):
+                    self.add(int(s), int(d), a)
+
+    def table(self, account_ids):
+        with self._lock:
+            return GraphFeatureTable({int(a): self.account_features(a) for a in set(account_ids)})
+
+    def features(self, df):
+        """(len(df) x 5) float32 GRAPH_FEATURES, after the batch's own transfers are added."""
+        self.fold(df)
+        return self.table(df["account_id"].tolist()).features(df)
+
+    def rebuild(self, days=GRAPH_DAYS, chunk=100000):
+        """Load every transfer of the last `days` (all with 0) in one bulk CSR build; returns the edge count."""
+        import numpy as np
+        since = datetime.now() - timedelta(days=days) if days else datetime(1970, 1, 1)
+        parts, last = [], 0
+        with get_conn() as conn:
+            cur = conn.cursor(buffered=False)
+            cur.execute(EDGES_SQL, (since,))
+            while rows := cur.fetchmany(chunk):
+                a = np.array([(r[1], r[2], float(r[3])) for r in rows], dtype=np.float64).reshape(-1, 3)
+                parts.append(a)
+                last = max(last, max(int(r[0]) for r in rows))
+        edges = np.concatenate(parts) if parts else np.zeros((0, 3))
+        src, dst, amt = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64), edges[:, 2]
+        n = int(max(src.max(initial=0), dst.max(initial=0))) + 1
+        with self._lock:
+            self._clear()
+            self._ensure(n - 1)
+            ones = np.ones(len(src), dtype=np.int64)
+            self._out = _CSR.build(src, dst, amt, ones, self.n)
+            self._in = _CSR.build(dst, src, amt, ones, self.n)
+            self.fan_out[:] = np.diff(self._out.indptr)
+            self.fan_in[:] = np.diff(self._in.indptr)
+            self.amount_out[:] = np.bincount(src, weights=amt, minlength=self.n)
+            self.amount_in[:] = np.bincount(dst, weights=amt, minlength=self.n)
+            self.folded = FoldedIds(floor=last)
+            self.ready = True
+        return len(src)
+
+    def accounts(self):
+        """Every account with at least one transfer edge."""
+        import numpy as np
+        with self._lock:
+            if not self.n:
+                return []
+            return np.flatnonzero((self.fan_in > 0) | (self.fan_out > 0)).tolist()
+
+transfer_graph = TransferGraph()
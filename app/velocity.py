@@ -0,0 +1,219 @@
+import os
+import threading
+from array import array
+from datetime import datetime, timedelta
+
+from app.db import get_conn
+from app.folded import FoldedIds
+
+HOUR, DAY = 3600.0, 86400.0
+MAX_EVENTS = int(os.getenv("VELOCITY_MAX_EVENTS", "512"))  # per-account 24h buffer cap; older events drop off
+# rebuild(): the last 24 hours in arrival order, read from idx_txn_time
+WINDOW_SQL = """
+    SELECT account_id, txn_id, txn_time, amount, location, channel
+    FROM Transaction WHERE txn_time >= %s
+    ORDER BY txn_time, txn_id
+"""
+VELOCITY_FEATURES = ("txn_count_1h", "amount_1h", "txn_count_24h", "amount_24h",
+                     "distinct_locations_24h", "channel_switches_24h")
+
+def epoch_seconds(values):
+    """Naive txn_time values (datetimes / strings / a Series) as float seconds, on one consistent clock."""
+    import numpy as np
+    import pandas as pd
+    return pd.to_datetime(pd.Series(values)).to_numpy("datetime64[us]").astype(np.int64) / 1e6
+
+class AccountWindow:
+    """
+    One account's transactions of the last 24 hours in a growable ring
+    buffer (float arrays for time and amount), with running aggregates for
+    the 1h and 24h windows. Two cursors mark where each window starts, so
+    folding in a transaction or reading the aggregates is O(1) amortized:
+    every event is evicted from each window exactly once.
+
+    Time only moves forward: an event older than the newest one seen
+    (late or out-of-order rows) counts as arriving at that newest time.
+    A channel switch is a transaction on a different channel from the
+    account's previous one.
+    """
+    __slots__ = ("times", "amounts", "locations", "switched", "head", "mid", "end", "now",
+                 "amount_1h", "amount_24h", "location_counts", "switches_24h", "last_channel")
+
+    def __init__(self, capacity=8):
+        self.times = array("d", bytes(8 * capacity))
+        self.amounts = array("d", bytes(8 * capacity))
+        self.locations = [None] * capacity
+        self.switched = array("b", bytes(capacity))
+        self.head = self.mid = self.end = 0  # absolute positions: 24h start, 1h start, next free
+        self.now = float("-inf")
+        self.amount_1h = self.amount_24h = 0.0
+        self.location_counts = {}
+        self.switches_24h = 0
+        self.last_channel = None
+
+    def _grow(self):
+        cap, new = len(self.times), 2 * len(self.times)
+        times, amounts = array("d", bytes(8 * new)), array("d", bytes(8 * new))
+        locations, switched = [None] * new, array("b", bytes(new))
+        for i in range(self.head, self.end):
+            times[i % new], amounts[i % new] = self.times[i % cap], self.amounts[i % cap]
+            locations[i % new], switched[i % new] = self.locations[i % cap], self.switched[i % cap]
+        self.times, self.amounts, self.locations, self.switched = times, amounts, locations, switched
+
+    def _evict_head(self):
+        p = self.head % len(self.times)
+        if self.mid == self.head:
+            self.amount_1h -= self.amounts[p]
+            self.mid += 1
+        self.amount_24h -= self.amounts[p]
+        loc = self.locations[p]
+        if self.location_counts[loc] == 1:
+            del self.location_counts[loc]
+        else:
+            self.location_counts[loc] -= 1
+        self.switches_24h -= self.switched[p]
+        self.locations[p] = None
+        self.head += 1
+        if self.head == self.end:
+            self.amount_1h = self.amount_24h = 0.0  # drop accumulated float drift
+
+    def advance(self, t):
+        """Move the clock to t (never backwards) and drop events that left either window."""
+        self.now = max(self.now, t)
+        cap = len(self.times)
+        while self.head < self.end and self.times[self.head % cap] <= self.now - DAY:
+            self._evict_head()
+        while self.mid < self.end and self.times[self.mid % cap] <= self.now - HOUR:
+            self.amount_1h -= self.amounts[self.mid % cap]
+            self.mid += 1
+
+    def push(self, t, amount, location, channel):
+        self.advance(t)
+        if self.end - self.head == len(self.times):
+            if len(self.times) < MAX_EVENTS:
+                self._grow()
+            else:
+                self._evict_head()
+        p = self.end % len(self.times)
+        switched = int(self.last_channel is not None and channel != self.last_channel)
+        self.times[p], self.amounts[p], self.locations[p], self.switched[p] = self.now, amount, location, switched
+        self.end += 1
+        self.amount_1h += amount
+        self.amount_24h += amount
+        self.location_counts[location] = self.location_counts.get(location, 0) + 1
+        self.switches_24h += switched
+        self.last_channel = channel
+
+    def aggregates(self):
+        return (self.end - self.mid, self.amount_1h, self.end - self.head, self.amount_24h,
+                len(self.location_counts), self.switches_24h)
+
+    def preview(self, t, amount, location, channel):
+        """aggregates() as if (t, amount, location, channel) were pushed; only the clock moves."""
+        self.advance(t)
+        n1, a1, n24, a24, locs, switches = self.aggregates()
+        new_location = location is not None and location not in self.location_counts
+        switched = self.last_channel is not None and channel != self.last_channel
+        return n1 + 1, a1 + amount, n24 + 1, a24 + amount, locs + new_location, switches + switched
+
+class VelocityStore:
+    """
+    Rolling-window velocity features for every account, in memory only.
+
+    The scoring path folds each transaction in as it featurizes it, so the
+    features need no self-joins on Transaction; after a restart rebuild()
+    replays the last 24 hours from Transaction once. Replayed rows are
+    recognized by id (see FoldedIds), so they never count twice while a
+    late-committing row still counts once.
+    """
+
+    def __init__(self, snapshot=None, folded=()):
+        self._windows = {}  # account_id -> AccountWindow
+        self._lock = threading.RLock()
+        self.folded = FoldedIds(ids=folded)
+        self.ready = False
+        if snapshot:
+            # detached copy for a scoring worker (see ParallelScorer); `folded` lists the ids the owner had folded
+            self._windows = dict(snapshot)
+            self.ready = True
+
+    def window(self, account_id):
+        w = self._windows.get(account_id)
+        if w is None:
+            w = self._windows[account_id] = AccountWindow()
+        return w
+
+    def snapshot(self, account_ids=None):
+        """The given (or all) accounts' windows, for pickling to a worker process."""
+        with self._lock:
+            ids = self._windows if account_ids is None else account_ids
+            return {int(a): self.window(int(a)) for a in ids}
+
+    def merge(self, snapshot, txn_ids=()):
+        """Adopt windows a worker advanced for its accounts from txn_ids."""
+        with self._lock:
+            self._windows.update(snapshot)
+            for t in txn_ids:
+                self.folded.add(int(t))
+
+    def replays(self, df):
+        """txn_ids of df already folded in."""
+        with self._lock:
+            return [int(t) for t in df["txn_id"].tolist() if t in self.folded]
+
+    def features(self, df):
+        """(len(df) x 6) float32 VELOCITY_FEATURES; rows are folded in txn_id order, each read right after its own fold."""
+        import numpy as np
+        acc = df["account_id"].to_numpy()
+        txn = df["txn_id"].to_numpy()
+        t = epoch_seconds(df["txn_time"])
+        amt = df["amount"].to_numpy(dtype=float)
+        loc, ch = df["location"].tolist(), df["channel"].tolist()
+        V = np.zeros((len(df), len(VELOCITY_FEATURES)), dtype=np.float32)
+        with self._lock:
+            for i in np.argsort(txn, kind="stable"):
+                w = self.window(int(acc[i]))
+                if self.folded.claim(int(txn[i])):
+                    w.push(float(t[i]), float(amt[i]), loc[i], ch[i])
+                V[i] = w.aggregates()
+        return V
+
+    def preview(self, account_id, amount, channel, location=None, when=None):
+        """Features a new posting would get, without folding it in (pre-authorization path)."""
+        t = float(epoch_seconds([when or datetime.now()])[0])
+        with self._lock:
+            return self.window(int(account_id)).preview(t, float(amount), location, channel)
+
+    def fold(self, account_id, txn_id, amount, channel, location=None, when=None):
+        """Fold in one committed posting (e.g. the customer CLI's own, ahead of the daemon)."""
+        t = float(epoch_seconds([when or datetime.now()])[0])
+        with self._lock:
+            if self.folded.claim(int(txn_id)):
+                self.window(int(account_id)).push(t, float(amount), location, channel)
+
+    def rebuild(self, hours=24):
+        """Replay the last `hours` of Transaction into fresh windows; returns the rows folded."""
+        since = datetime.now() - timedelta(hours=hours)
+        windows, last, n = {}, 0, 0
+        with get_conn() as conn:
+            cur = conn.cursor(buffered=False)
+            cur.execute(WINDOW_SQL, (since,))
+            while True:
+                rows = cur.fetchmany(10000)
+                if not rows:
+                    break
+                t = epoch_seconds([r[2] for r in rows])
+                for (a, txn_id, _, amount, location, channel), ts in zip(rows, t.tolist()):
+                    w = windows.get(a)
+                    if w is None:
+                        w = windows[a] = AccountWindow()
+                    w.push(ts, float(amount), location, channel)
+                    last = max(last, int(txn_id))
+                n += len(rows)
+        with self._lock:
+            self._windows = windows
+            self.folded = FoldedIds(floor=last)
+            self.ready = True
+        return n
+
+velocity = VelocityStore()
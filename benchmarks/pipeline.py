@@ -0,0 +1,225 @@
+# benchmarks/pipeline.py
+"""
+End-to-end throughput of the scoring / analytics pipeline on synthetic data.
+
+For each scale (default 10k, 100k and 1M transactions) this:
+1. recreates every table in a scratch database, applies db/migrations/ and
+   seeds --accounts accounts
+2. loads the transactions with scripts/generate_dummy_data.generate()
+3. times fetch_recent_txns, featurize, the IsolationForest fit and score,
+   score_and_write, refresh_rollups, each export_csvs exporter and
+   evaluate_model (in-memory and --streaming)
+
+Load and pipeline each run in a fresh process, so peak RSS (ru_maxrss, the
+process high-water mark after each stage) is not inflated by earlier scales.
+Results are written as JSON: rows/s and peak RSS per stage and scale.
+
+By default the database is the embedded SQLite backend in a temporary file
+(DB_BACKEND=sqlite), so nothing else needs to be running. With
+--backend mysql it is the scratch database BENCH_DB_NAME (default
+bankfraud_bench) on the server configured by DB_HOST/DB_PORT/DB_USER/DB_PASS;
+it must already exist (CREATE DATABASE bankfraud_bench), all of its tables
+are dropped and recreated, and the benchmark refuses to run against the
+app's own DB_NAME.
+
+Usage:
+  python -m benchmarks.pipeline [--backend sqlite|mysql] [--scales 10000,100000,1000000]
+                                [--accounts 1000] [--out results.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = ROOT / "db" / "schema.sql"
+BENCH_DB = os.getenv("BENCH_DB_NAME", "bankfraud_bench")
+SCALES = (10_000, 100_000, 1_000_000)
+ACCOUNTS = 1000
+REGIONS = ("North", "West", "South", "East", None)
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KiB elsewhere
+
+
+class Stages:
+    """Collects {stage, rows, seconds, rows_per_s, peak_rss_mb} records."""
+
+    def __init__(self):
+        self.records = []
+
+    def run(self, name, rows, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        dt = time.perf_counter() - t0
+        n = rows(out) if callable(rows) else rows
+        self.records.append({
+            "stage": name, "rows": int(n), "seconds": round(dt, 4),
+            "rows_per_s": round(n / dt, 1) if dt > 0 else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+        return out
+
+
+def schema_statements():
+    sql = "\n".join(line for line in SCHEMA.read_text().splitlines()
+                    if not line.strip().startswith("--"))
+    return [s.strip() for s in sql.split(";") if s.strip() and not s.strip().upper().startswith("USE ")]
+
+
+def reset_db(accounts):
+    """Drop and recreate every schema table in the scratch DB, migrate it, then seed customers + accounts."""
+    from app.bulk_writer import bulk_insert
+    from app.db import BACKEND, SQLITE_PATH, get_conn
+    from scripts.migrate import migrate
+    if BACKEND == "sqlite":
+        for suffix in ("", "-wal", "-shm"):
+            Path(SQLITE_PATH + suffix).unlink(missing_ok=True)
+        migrate()  # the first connection creates the schema
+        _seed(bulk_insert, accounts)
+        return
+    statements = schema_statements()
+    tables = [re.match(r"CREATE TABLE\s+(\w+)", s, re.I).group(1) for s in statements
+              if re.match(r"CREATE TABLE", s, re.I)]
+    with get_conn() as conn:
+        cur = conn.cursor()
+        cur.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in reversed(tables):
+            cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute("SET FOREIGN_KEY_CHECKS = 1")
+        for stmt in statements:
+            cur.execute(stmt)
+    migrate()
+    _seed(bulk_insert, accounts)
+
+
+def _seed(bulk_insert, accounts):
+    customers = [(f"Bench {i}", f"bench{i}@example.com", f"9{i:09d}", REGIONS[i % len(REGIONS)])
+                 for i in range(1, accounts + 1)]
+    bulk_insert("Customer", ["name", "email", "phone", "region"], customers, report=None)
+    bulk_insert("Account", ["customer_id", "account_type", "balance"],
+                [(i, "SAVINGS" if i % 3 else "CURRENT", 50000.0 + 97 * i) for i in range(1, accounts + 1)],
+                report=None)
+
+
+def load_phase(n, accounts):
+    """Child process: fresh schema + n generated transactions."""
+    stages = Stages()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from scripts.generate_dummy_data import generate, generate_loans
+        stages.run("reset_db", accounts, reset_db, accounts)
+        stages.run("generate", n, generate, n)
+        stages.run("generate_loans", 500, generate_loans, 500)
+    return stages.records
+
+
+def pipeline_phase(n, export_dir):
+    """Child process: every timed pipeline stage over the n most recent transactions."""
+    stages = Stages()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import analytics.evaluate_model as em
+        import analytics.export_csvs as ec
+        from analytics.rollups import refresh_rollups
+        from app.account_stats import AccountStatsStore
+        from app.fraud_model import featurize, fetch_recent_txns, fit_model, score_and_write
+        ec.EXPORT_DIR = em.EXPORT_DIR = Path(export_dir)  # keep analytics/exports untouched
+
+        df = stages.run("fetch_recent_txns", len, fetch_recent_txns, n)
+        rows = len(df)
+        df, X = stages.run("featurize", rows, featurize, df, AccountStatsStore())
+        clf, bounds = stages.run("iforest_fit", rows, fit_model, X)
+        scores = -stages.run("iforest_score", rows, clf.decision_function, X)
+        stages.run("score_and_write", rows, score_and_write, df, scores, {"bounds": bounds, "version": "bench"})
+        del df, X, scores
+
+        stages.run("refresh_rollups", rows, refresh_rollups)
+        for export in ec.EXPORTERS:
+            stages.run(export.__name__, rows, export)
+
+        def evaluate_in_memory():
+            latest = em.fetch_latest_scores()
+            y_true = em.label_from_reason(latest).values
+            return em.evaluate(latest, y_true, latest["flagged"].values, plots=False)
+
+        stages.run("evaluate_model", rows, evaluate_in_memory)
+        stages.run("evaluate_model_streaming", rows,
+                   lambda: em.evaluate_streaming(em.iter_latest_scores(), plots=False))
+    return stages.records
+
+
+def in_child(fn, *args):
+    # spawn, not fork: the child starts with an empty heap, so ru_maxrss is its own
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the pipeline at several synthetic data scales.")
+    ap.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite",
+                    help="sqlite: embedded engine in a temp file (default); mysql: the BENCH_DB_NAME scratch DB.")
+    ap.add_argument("--scales", default=",".join(str(s) for s in SCALES),
+                    help="Comma-separated transaction counts (default 10000,100000,1000000).")
+    ap.add_argument("--accounts", type=int, default=ACCOUNTS, help="Accounts seeded into the scratch DB.")
+    ap.add_argument("--out", metavar="PATH", help="Write the JSON report here (default: stdout).")
+    args = ap.parse_args(argv)
+
+    work_dir = tempfile.TemporaryDirectory()
+    export_dir = work_dir.name
+    # the settings below are inherited by the child processes
+    os.environ["DB_BACKEND"] = args.backend
+    if args.backend == "sqlite":
+        os.environ["DB_SQLITE_PATH"] = database = str(Path(work_dir.name) / "bench.sqlite3")
+    else:
+        from dotenv import load_dotenv
+        load_dotenv()  # as app.db does, so DB_NAME below is the app's real database
+        if BENCH_DB == os.getenv("DB_NAME", "bankfraud"):
+            raise SystemExit(f"BENCH_DB_NAME={BENCH_DB} is the application database; pick a scratch database.")
+        os.environ["DB_NAME"] = database = BENCH_DB
+
+    report = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": args.backend,
+            "database": database,
+            "accounts": args.accounts,
+        },
+        "scales": {},
+    }
+    with work_dir:
+        for n in (int(s) for s in args.scales.split(",")):
+            print(f"[{n:,} txns] loading...", file=sys.stderr)
+            load = in_child(load_phase, n, args.accounts)
+            print(f"[{n:,} txns] running pipeline...", file=sys.stderr)
+            stages = in_child(pipeline_phase, n, export_dir)
+            report["scales"][str(n)] = {"load": load, "stages": stages}
+            for s in stages:
+                print(f"  {s['stage']:<26} {s['seconds']:9.3f}s {s['rows_per_s'] or 0:>14,.0f} rows/s "
+                      f"{s['peak_rss_mb']:9.1f} MB", file=sys.stderr)
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(out)
+        print(f"Saved {args.out}", file=sys.stderr)
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    main()
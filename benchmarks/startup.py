@@ -0,0 +1,94 @@
+# benchmarks/startup.py
+"""
+Cold-start cost of each entry point.
+
+For every module below this runs `python -X importtime -m <module> --help`
+in a fresh interpreter (best of --runs), and reports:
+- wall time until --help has printed
+- total import time (sum of top-level cumulative times from -X importtime)
+- the slowest top-level imports, and which heavy libraries got loaded
+
+--help never needs numpy / pandas / sklearn / matplotlib, so any of them
+showing up under "heavy" is a regression in the lazy-import layout.
+
+Usage:
+  python -m benchmarks.startup [--runs 5] [--top 5] [--json out.json]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENTRY_POINTS = [
+    "app.fraud_model",
+    "app.fraud_daemon",
+    "analytics.evaluate_model",
+    "analytics.export_csvs",
+    "scripts.generate_dummy_data",
+]
+HEAVY = ("numpy", "pandas", "sklearn", "matplotlib")
+
+
+def parse_importtime(stderr: str):
+    """[(package, self_us, cumulative_us, depth)] from -X importtime output."""
+    out = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2  # "| " then two more spaces per nesting level
+        out.append((name.strip(), int(self_us), int(cum_us), depth))
+    return out
+
+
+def measure(module: str):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", module, "--help"],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise SystemExit(f"{module} --help failed:\n{proc.stderr[-2000:]}")
+    imports = parse_importtime(proc.stderr)
+    top = [(name, cum) for name, _, cum, depth in imports if depth == 0]
+    return {
+        "wall_ms": wall * 1000,
+        "import_ms": sum(cum for _, cum in top) / 1000,
+        "slowest": sorted(top, key=lambda t: -t[1]),
+        "heavy": sorted({name.split(".")[0] for name, *_ in imports} & set(HEAVY)),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Measure import / cold-start time of each entry point.")
+    ap.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point; best run is kept.")
+    ap.add_argument("--top", type=int, default=5, help="Slowest top-level imports to list per entry point.")
+    ap.add_argument("--json", metavar="PATH", help="Also write the results as JSON.")
+    ap.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Entry points to measure.")
+    args = ap.parse_args(argv)
+
+    results = {}
+    for module in args.modules:
+        runs = [measure(module) for _ in range(max(args.runs, 1))]
+        best = min(runs, key=lambda r: r["wall_ms"])
+        best["slowest"] = [{"module": m, "ms": us / 1000} for m, us in best["slowest"][:args.top]]
+        results[module] = best
+
+        print(f"\n{module}")
+        print(f"  --help wall: {best['wall_ms']:8.1f} ms   imports: {best['import_ms']:8.1f} ms")
+        print(f"  heavy libs:  {', '.join(best['heavy']) or 'none'}")
+        for s in best["slowest"]:
+            print(f"    {s['ms']:8.1f} ms  {s['module']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+        print(f"\nSaved {args.json}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
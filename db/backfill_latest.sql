@@ -0,0 +1,12 @@
+USE bankfraud;
+
+-- One-off for databases created before FraudScoreLatest existed:
+-- copy the newest FraudScore row of every transaction into it.
+INSERT INTO FraudScoreLatest (txn_id, anomaly_score, flagged, reason, model_version, scored_at)
+SELECT fs.txn_id, fs.anomaly_score, fs.flagged, fs.reason, fs.model_version, fs.scored_at
+FROM FraudScore fs
+JOIN (SELECT txn_id, MAX(score_id) AS max_sid FROM FraudScore GROUP BY txn_id) l
+  ON l.max_sid = fs.score_id
+ON DUPLICATE KEY UPDATE anomaly_score=VALUES(anomaly_score), flagged=VALUES(flagged),
+                        reason=VALUES(reason), model_version=VALUES(model_version),
+                        scored_at=VALUES(scored_at);
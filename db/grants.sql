@@ -4,7 +4,11 @@ GRANT SELECT,INSERT,UPDATE ON bankfraud.Customer  TO role_employee;
 GRANT SELECT,INSERT,UPDATE ON bankfraud.Account   TO role_employee;
 GRANT SELECT,INSERT,UPDATE ON bankfraud.Loan      TO role_employee;
 GRANT SELECT ON bankfraud.Transaction             TO role_employee;
+GRANT SELECT,UPDATE ON bankfraud.HeldTransaction  TO role_employee;
 
 GRANT SELECT ON bankfraud.Customer TO role_customer;
 GRANT SELECT,INSERT ON bankfraud.Transaction TO role_customer;
+GRANT INSERT ON bankfraud.ScoringOutbox TO role_customer;
+GRANT INSERT ON bankfraud.HeldTransaction TO role_customer;
+GRANT SELECT ON bankfraud.AccountStats TO role_customer;
 GRANT SELECT,UPDATE ON bankfraud.Account TO role_customer;
\ No newline at end of file
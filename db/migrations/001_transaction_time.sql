@@ -0,0 +1,3 @@
+-- fetch_recent_txns / train_model: ORDER BY txn_time DESC LIMIT n reads the newest n
+-- entries of this index; txn_id comes along as the primary key, so it is covering.
+CREATE INDEX idx_txn_time ON Transaction (txn_time);
@@ -0,0 +1,3 @@
+-- view_customer_history: one account's rows in (txn_time, txn_id) order, covering the
+-- columns it shows. Also serves the Transaction.account_id foreign key.
+CREATE INDEX idx_txn_account_time ON Transaction (account_id, txn_time, txn_id, txn_type, amount);
@@ -0,0 +1,3 @@
+-- latest score per transaction (MAX(score_id) ... GROUP BY txn_id) in the region rollup,
+-- backfill_latest.sql and rescore lookups. Also serves the FraudScore.txn_id foreign key.
+CREATE INDEX idx_fraudscore_txn_score ON FraudScore (txn_id, score_id);
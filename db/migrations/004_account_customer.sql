@@ -0,0 +1,3 @@
+-- view_customer_history: a customer's accounts. MySQL already indexes the foreign key;
+-- this one also covers account_id and gives SQLite (which does not) the same path.
+CREATE INDEX idx_account_customer ON Account (customer_id, account_id);
@@ -0,0 +1,2 @@
+-- loan_stats export: GROUP BY status with SUM(amount) from the index alone.
+CREATE INDEX idx_loan_status_amount ON Loan (status, amount);
@@ -0,0 +1,12 @@
+-- the queue itself, on databases created before it existed (a no-op where db/schema.sql or
+-- db/schema_sqlite.sql already created it); it must be there before the index below.
+CREATE TABLE IF NOT EXISTS ScoringOutbox(
+  outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  txn_id BIGINT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (txn_id) REFERENCES Transaction(txn_id)
+);
+
+-- fraud_daemon watermark writes: DELETE FROM ScoringOutbox WHERE txn_id <= watermark
+-- retires entries the watermark source already scored without scanning the queue.
+CREATE INDEX idx_outbox_txn ON ScoringOutbox (txn_id);
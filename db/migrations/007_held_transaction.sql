@@ -0,0 +1,14 @@
+-- pre-authorization holds (app/customer_cli.py) on databases created before the table existed;
+-- a no-op where db/schema.sql or db/schema_sqlite.sql already created it.
+CREATE TABLE IF NOT EXISTS HeldTransaction(
+  hold_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  account_id INT NOT NULL,
+  txn_type VARCHAR(16) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  counterparty_account INT NULL,
+  channel VARCHAR(16) NOT NULL,
+  score DOUBLE NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'PENDING',
+  held_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
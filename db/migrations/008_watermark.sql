@@ -0,0 +1,7 @@
+-- fraud_daemon / rollups progress markers, on databases created before the table existed;
+-- a no-op where db/schema.sql or db/schema_sqlite.sql already created it.
+CREATE TABLE IF NOT EXISTS Watermark(
+  name VARCHAR(50) PRIMARY KEY,
+  last_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
@@ -0,0 +1,3 @@
+-- model registry: the version that produced each score (also read by db/backfill_latest.sql).
+-- scripts.migrate skips it where db/schema.sql or db/schema_sqlite.sql already has the column.
+ALTER TABLE FraudScore ADD COLUMN model_version VARCHAR(32) NULL;
@@ -0,0 +1,11 @@
+-- persisted per-account running amount statistics (app/account_stats.py), on databases
+-- created before the table existed; a no-op where the schema files already created it.
+CREATE TABLE IF NOT EXISTS AccountStats(
+  account_id INT PRIMARY KEY,
+  n BIGINT NOT NULL DEFAULT 0,
+  mean DOUBLE NOT NULL DEFAULT 0,
+  m2 DOUBLE NOT NULL DEFAULT 0,
+  last_txn_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
@@ -0,0 +1,12 @@
+-- newest score per transaction (app/fraud_model.py writes it alongside FraudScore), on
+-- databases created before the table existed; a no-op where the schema files already created it.
+-- Fill it from existing scores once with db/backfill_latest.sql.
+CREATE TABLE IF NOT EXISTS FraudScoreLatest(
+  txn_id BIGINT PRIMARY KEY,
+  anomaly_score DOUBLE NOT NULL,
+  flagged BOOLEAN DEFAULT FALSE,
+  reason VARCHAR(255),
+  model_version VARCHAR(32) NULL,
+  scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (txn_id) REFERENCES Transaction(txn_id)
+);
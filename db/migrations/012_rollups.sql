@@ -0,0 +1,15 @@
+-- incremental export rollups (analytics/rollups.py), on databases created before the
+-- tables existed; no-ops where db/schema.sql or db/schema_sqlite.sql already created them.
+CREATE TABLE IF NOT EXISTS TxnDailyRollup(
+  day DATE PRIMARY KEY,
+  txn_count BIGINT NOT NULL DEFAULT 0,
+  total_amount DECIMAL(18,2) NOT NULL DEFAULT 0
+);
+
+-- region '' = customers without a region
+CREATE TABLE IF NOT EXISTS RegionScoreRollup(
+  region VARCHAR(50) PRIMARY KEY,
+  score_sum DOUBLE NOT NULL DEFAULT 0,
+  flags BIGINT NOT NULL DEFAULT 0,
+  scored_rows BIGINT NOT NULL DEFAULT 0
+);
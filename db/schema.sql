@@ -64,6 +64,74 @@ CREATE TABLE FraudScore(
   anomaly_score DOUBLE NOT NULL,
   flagged BOOLEAN DEFAULT FALSE,
   reason VARCHAR(255),
+  model_version VARCHAR(32) NULL,
   scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   FOREIGN KEY (txn_id) REFERENCES Transaction(txn_id)
-);
\ No newline at end of file
+);
+
+CREATE TABLE Watermark(
+  name VARCHAR(50) PRIMARY KEY,
+  last_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE AccountStats(
+  account_id INT PRIMARY KEY,
+  n BIGINT NOT NULL DEFAULT 0,
+  mean DOUBLE NOT NULL DEFAULT 0,
+  m2 DOUBLE NOT NULL DEFAULT 0,
+  last_txn_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
+
+CREATE TABLE FraudScoreLatest(
+  txn_id BIGINT PRIMARY KEY,
+  anomaly_score DOUBLE NOT NULL,
+  flagged BOOLEAN DEFAULT FALSE,
+  reason VARCHAR(255),
+  model_version VARCHAR(32) NULL,
+  scored_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (txn_id) REFERENCES Transaction(txn_id)
+);
+
+CREATE TABLE ScoringOutbox(
+  outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  txn_id BIGINT NOT NULL,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (txn_id) REFERENCES Transaction(txn_id)
+);
+
+-- postings the pre-authorization check held for review (app/customer_cli.py); never posted
+CREATE TABLE HeldTransaction(
+  hold_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  account_id INT NOT NULL,
+  txn_type VARCHAR(16) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  counterparty_account INT NULL,
+  channel VARCHAR(16) NOT NULL,
+  score DOUBLE NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'PENDING',
+  held_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
+
+CREATE TABLE TxnDailyRollup(
+  day DATE PRIMARY KEY,
+  txn_count BIGINT NOT NULL DEFAULT 0,
+  total_amount DECIMAL(18,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE RegionScoreRollup(
+  region VARCHAR(50) PRIMARY KEY,  -- '' = customers without a region
+  score_sum DOUBLE NOT NULL DEFAULT 0,
+  flags BIGINT NOT NULL DEFAULT 0,
+  scored_rows BIGINT NOT NULL DEFAULT 0
+);
+
+-- versions from db/migrations/ already applied (see scripts/migrate.py)
+CREATE TABLE SchemaMigration(
+  version INT PRIMARY KEY,
+  name VARCHAR(100) NOT NULL,
+  applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,142 @@
+-- SQLite version of schema.sql, for DB_BACKEND=sqlite (embedded, single node).
+-- Same tables and columns; ENUMs become CHECK constraints, AUTO_INCREMENT
+-- becomes AUTOINCREMENT (ids are never reused, as in MySQL) and timestamps
+-- default to local time like MySQL's CURRENT_TIMESTAMP.
+-- "Transaction" is a keyword in SQLite, so the table name is quoted.
+-- Safe to re-run: app.sqlite_db applies it on first use of a database file.
+
+CREATE TABLE IF NOT EXISTS Customer(
+  customer_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(100) NOT NULL,
+  email VARCHAR(120) UNIQUE NOT NULL,
+  phone VARCHAR(20),
+  region VARCHAR(50),
+  created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS Employee(
+  employee_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name VARCHAR(100) NOT NULL,
+  role TEXT NOT NULL CHECK (role IN ('ADMIN','EMPLOYEE')),
+  email VARCHAR(120) UNIQUE NOT NULL,
+  created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS Account(
+  account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INT NOT NULL,
+  account_type TEXT NOT NULL CHECK (account_type IN ('SAVINGS','CURRENT')),
+  balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+  status TEXT DEFAULT 'ACTIVE' CHECK (status IN ('ACTIVE','FROZEN','CLOSED')),
+  created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS Loan(
+  loan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  customer_id INT NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  interest_rate DECIMAL(5,2) NOT NULL,
+  tenure_months INT NOT NULL,
+  status TEXT DEFAULT 'APPLIED' CHECK (status IN ('APPLIED','APPROVED','REJECTED','DISBURSED','CLOSED')),
+  applied_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (customer_id) REFERENCES Customer(customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS "Transaction"(
+  txn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  account_id INT NOT NULL,
+  txn_time TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  txn_type TEXT NOT NULL CHECK (txn_type IN ('DEPOSIT','WITHDRAW','TRANSFER_OUT','TRANSFER_IN')),
+  amount DECIMAL(12,2) NOT NULL,
+  counterparty_account INT NULL,
+  channel TEXT NOT NULL CHECK (channel IN ('BRANCH','ATM','ONLINE','MOBILE')),
+  location VARCHAR(80) NULL,
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
+
+CREATE TABLE IF NOT EXISTS UserAuth(
+  user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username VARCHAR(60) UNIQUE NOT NULL,
+  password_hash VARCHAR(255) NOT NULL,
+  role TEXT NOT NULL CHECK (role IN ('ADMIN','EMPLOYEE','CUSTOMER')),
+  ref_id INT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS FraudScore(
+  score_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  txn_id BIGINT NOT NULL,
+  anomaly_score DOUBLE NOT NULL,
+  flagged BOOLEAN DEFAULT FALSE,
+  reason VARCHAR(255),
+  model_version VARCHAR(32) NULL,
+  scored_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (txn_id) REFERENCES "Transaction"(txn_id)
+);
+
+CREATE TABLE IF NOT EXISTS Watermark(
+  name VARCHAR(50) PRIMARY KEY,
+  last_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS AccountStats(
+  account_id INT PRIMARY KEY,
+  n BIGINT NOT NULL DEFAULT 0,
+  mean DOUBLE NOT NULL DEFAULT 0,
+  m2 DOUBLE NOT NULL DEFAULT 0,
+  last_txn_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
+
+CREATE TABLE IF NOT EXISTS FraudScoreLatest(
+  txn_id BIGINT PRIMARY KEY,
+  anomaly_score DOUBLE NOT NULL,
+  flagged BOOLEAN DEFAULT FALSE,
+  reason VARCHAR(255),
+  model_version VARCHAR(32) NULL,
+  scored_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (txn_id) REFERENCES "Transaction"(txn_id)
+);
+
+CREATE TABLE IF NOT EXISTS ScoringOutbox(
+  outbox_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  txn_id BIGINT NOT NULL,
+  created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (txn_id) REFERENCES "Transaction"(txn_id)
+);
+
+-- postings the pre-authorization check held for review (app/customer_cli.py); never posted
+CREATE TABLE IF NOT EXISTS HeldTransaction(
+  hold_id INTEGER PRIMARY KEY AUTOINCREMENT,
+  account_id INT NOT NULL,
+  txn_type VARCHAR(16) NOT NULL,
+  amount DECIMAL(12,2) NOT NULL,
+  counterparty_account INT NULL,
+  channel VARCHAR(16) NOT NULL,
+  score DOUBLE NOT NULL,
+  status VARCHAR(16) NOT NULL DEFAULT 'PENDING',
+  held_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+  FOREIGN KEY (account_id) REFERENCES Account(account_id)
+);
+
+CREATE TABLE IF NOT EXISTS TxnDailyRollup(
+  day DATE PRIMARY KEY,
+  txn_count BIGINT NOT NULL DEFAULT 0,
+  total_amount DECIMAL(18,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS RegionScoreRollup(
+  region VARCHAR(50) PRIMARY KEY,  -- '' = customers without a region
+  score_sum DOUBLE NOT NULL DEFAULT 0,
+  flags BIGINT NOT NULL DEFAULT 0,
+  scored_rows BIGINT NOT NULL DEFAULT 0
+);
+
+-- versions from db/migrations/ already applied (see scripts/migrate.py)
+CREATE TABLE IF NOT EXISTS SchemaMigration(
+  version INT PRIMARY KEY,
+  name VARCHAR(100) NOT NULL,
+  applied_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
@@ -12,7 +12,7 @@ def run_customer():
 
 def export_analytics():
     from analytics.export_csvs import main as export_main
-    export_main()
+    export_main([])
 
 if __name__ == "__main__":
     print("1) Admin  2) Employee  3) Customer  4) Export Analytics CSVs  0) Exit")
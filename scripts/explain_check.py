@@ -0,0 +1,140 @@
+# scripts/explain_check.py
+"""
+EXPLAIN every hot query in app/ and analytics/ against the configured
+database and fail if one of them falls back to a full table scan or a
+filesort, or does not use the index it is expected to, i.e. if an index
+from db/migrations/ is missing or stopped being used.
+
+MySQL: EXPLAIN, flagging type=ALL and "Using filesort"; the expected index
+must be the key of some row (PRIMARY for the primary key).
+SQLite (DB_BACKEND=sqlite): EXPLAIN QUERY PLAN, flagging "SCAN <table>"
+without an index and "USE TEMP B-TREE FOR ORDER BY"; the expected index
+must be named in the plan (PRIMARY matches the primary key or its
+autoindex).
+
+Run after scripts.migrate, on a database with some data in it (plans on
+empty tables are not representative on MySQL). Exits 1 on any problem.
+
+Usage:
+  python -m scripts.explain_check [--verbose]
+"""
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta
+
+from analytics.evaluate_model import LATEST_SCORES_SQL
+from analytics.export_csvs import FRAUD_BY_REGION_SQL, LOAN_STATS_SQL, TRANSACTIONS_DAILY_SQL
+from analytics.rollups import DAILY_SQL, REGION_SQL
+from app.db import BACKEND, get_conn
+from app.account_stats import stats_query
+from app.employee_cli import ACCOUNTS_SQL, history_query
+from app.fraud_model import OUTBOX_CLAIM_SQL, OUTBOX_DRAIN_SQL, between_query, txn_query
+from app.preauth import REGION_SQL as PREAUTH_REGION_SQL
+from app.transfer_graph import EDGES_SQL
+from app.velocity import WINDOW_SQL
+
+FULL_SCAN = "full_scan"
+FILESORT = "filesort"
+NOT_INDEXED = "not_using"
+PRIMARY = "PRIMARY"
+
+# a recent cut-off, so the plans show the range read (one older than all the data rightly scans)
+SINCE = datetime.now() - timedelta(hours=24)
+
+# (name, sql, params, allowed problems, expected index or None) -- every allowance says why
+HOT_QUERIES = [
+    # the outer ORDER BY txn_id re-sorts the `recent` rows picked via idx_txn_time
+    ("fetch_recent_txns", *txn_query(recent=20000), {FILESORT}, "idx_txn_time"),
+    ("iter_txns", *txn_query(0, 5000), set(), PRIMARY),
+    # TxnCursor gap re-read; the few rows of the OR'ed ranges are re-sorted (SQLite only)
+    ("fetch_txns_between", *between_query([(1000, 1010), (2000, 2500)]), {FILESORT}, PRIMARY),
+    # the head of the queue in primary key order; LIMIT stops the read (SQLite still reports SCAN)
+    ("fetch_outbox_txns", OUTBOX_CLAIM_SQL, (5000,), {FULL_SCAN}, None),
+    ("outbox_drain", OUTBOX_DRAIN_SQL, (1000,), set(), "idx_outbox_txn"),
+    ("velocity_rebuild", WINDOW_SQL, (SINCE,), set(), "idx_txn_time"),
+    ("transfer_graph_edges", EDGES_SQL, (SINCE,), set(), "idx_txn_time"),
+    ("account_stats_load", *stats_query([1, 2, 3]), set(), PRIMARY),
+    ("preauth_region_of", PREAUTH_REGION_SQL, (1,), set(), PRIMARY),
+    ("customer_summary", ACCOUNTS_SQL, (1,), set(), "idx_account_customer"),
+    ("view_customer_history", *history_query(1, 20), set(), "idx_txn_account_time"),
+    ("view_customer_history_page", *history_query(1, 20, "2024-01-01", "2025-01-01",
+                                                  ("2024-06-01 12:00:00", 1000)), set(), "idx_txn_account_time"),
+    ("rollup_txn_daily", DAILY_SQL, (0, 5000), set(), PRIMARY),
+    ("rollup_region_scores", REGION_SQL, (0, 5000, 0, 0, 5000), set(), "idx_fraudscore_txn_score"),
+    # exports read whole (small) rollup tables by design; sorts are on computed columns
+    ("export_transactions_daily", TRANSACTIONS_DAILY_SQL, (), {FULL_SCAN}, None),
+    ("export_fraud_by_region", FRAUD_BY_REGION_SQL, (), {FULL_SCAN, FILESORT}, None),
+    ("export_loan_stats", LOAN_STATS_SQL, (), {FILESORT}, "idx_loan_status_amount"),
+    # evaluation reads every latest score, in primary key order
+    ("evaluate_model", LATEST_SCORES_SQL, (), {FULL_SCAN}, None),
+]
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\S+)(?: AS \S+)?$")  # no "USING ... INDEX" -> reads every row
+_SQLITE_SUBQUERY = re.compile(r"^(?:MATERIALIZE|CO-ROUTINE) (\S+)")
+
+def problems_mysql(cur, sql, params, index):
+    cur.execute("EXPLAIN " + sql.strip().rstrip(";"), params)
+    rows = cur.fetchall()
+    found = []
+    if index and index not in (row.get("key") for row in rows):
+        found.append((NOT_INDEXED, index))
+    for row in rows:
+        table = row.get("table") or ""
+        if row.get("type") == "ALL" and not table.startswith("<"):  # <derivedN>/<unionN> are our own subqueries
+            found.append((FULL_SCAN, table))
+        if "Using filesort" in (row.get("Extra") or ""):
+            found.append((FILESORT, table))
+    return found, [f"{r.get('table')}: type={r.get('type')} key={r.get('key')} {r.get('Extra') or ''}" for r in rows]
+
+def _names_index(detail, index):
+    if index == PRIMARY:
+        return "PRIMARY KEY" in detail or "INDEX sqlite_autoindex_" in detail
+    return re.search(rf"INDEX {index}\b", detail) is not None
+
+def problems_sqlite(conn, sql, params, index):
+    from app.sqlite_db import dialect
+    q = dialect.translate(conn.raw, sql).strip().rstrip(";")
+    plan = [r[3] for r in conn.raw.execute("EXPLAIN QUERY PLAN " + q, tuple(params)).fetchall()]
+    subqueries = {m.group(1) for m in map(_SQLITE_SUBQUERY.match, plan) if m}
+    found = []
+    if index and not any(_names_index(detail, index) for detail in plan):
+        found.append((NOT_INDEXED, index))
+    for detail in plan:
+        m = _SQLITE_SCAN.match(detail)
+        if m and m.group(1) not in subqueries and m.group(1) != "CONSTANT":
+            found.append((FULL_SCAN, m.group(1)))
+        if "TEMP B-TREE FOR ORDER BY" in detail:
+            found.append((FILESORT, ""))
+    return found, plan
+
+def check(verbose=False):
+    """[(query name, problem, table)] for every disallowed problem."""
+    failures = []
+    with get_conn() as conn:
+        cur = conn.cursor(dictionary=True)
+        for name, sql, params, allow, index in HOT_QUERIES:
+            if BACKEND == "sqlite":
+                found, plan = problems_sqlite(conn, sql, params, index)
+            else:
+                found, plan = problems_mysql(cur, sql, params, index)
+            bad = [(kind, table) for kind, table in found if kind not in allow]
+            print(f"{'✗' if bad else '✓'} {name}" + "".join(f"  [{kind} {table}]" for kind, table in bad))
+            if verbose:
+                for line in plan:
+                    print(f"    {line}")
+            failures += [(name, kind, table) for kind, table in bad]
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser(description="Fail if a hot query falls back to a full scan or a filesort.")
+    ap.add_argument("--verbose", action="store_true", help="Print each query plan.")
+    args = ap.parse_args()
+    failures = check(args.verbose)
+    if failures:
+        print(f"{len(failures)} plan regression(s); apply pending migrations (python -m scripts.migrate).")
+        sys.exit(1)
+    print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,22 @@
 # scripts/generate_dummy_data.py
+import argparse
 import random
-import math
-from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
+import time
+from datetime import datetime
+from typing import List, Dict
 
-import numpy as np
+from app.bulk_writer import bulk_insert
 from app.db import get_conn
+from app.ledger import balance_update
 
 # ==== knobs you can tweak ====
 N_TXNS = 1500          # how many transactions to add (approx; transfers create 2 rows)
 DAYS_BACK = 60        # spread transactions over the last N days
 FRAUD_RATE = 0.20     # ~10% of txns will look suspicious
 SEED = 42
+CHUNK_EVENTS = 50000   # events drawn, inserted and committed per chunk
 # ============================
 
-random.seed(SEED)
-np.random.seed(SEED)
-
 CHANNELS = ["BRANCH", "ATM", "ONLINE", "MOBILE"]
 CITIES_BY_REGION = {
     "North":  ["Delhi", "Jaipur", "Chandigarh", "Lucknow"],
@@ -26,18 +26,14 @@ CITIES_BY_REGION = {
     None:     ["Metro"]
 }
 
-def _random_time_within(days_back: int) -> datetime:
-    # Bias a bit toward recent days
-    delta_days = int(np.random.beta(2, 6) * days_back)
-    dt = datetime.now() - timedelta(days=delta_days, hours=random.randint(0,23), minutes=random.randint(0,59))
-    return dt.replace(second=random.randint(0,59), microsecond=0)
-
-def _lognormal_amount(mu=8.5, sigma=0.7) -> float:
-    # gives a skewed distribution around a few thousand to tens of thousands
-    return float(max(100, np.random.lognormal(mean=mu, sigma=sigma)))
-
-def _choose_location(region: Optional[str]) -> str:
-    return random.choice(CITIES_BY_REGION.get(region, CITIES_BY_REGION[None]))
+def _city_table(regions):
+    """(accounts x 4) array of candidate cities, so a location is one fancy-indexing lookup."""
+    import numpy as np
+    rows = []
+    for region in regions:
+        cities = CITIES_BY_REGION.get(region, CITIES_BY_REGION[None])
+        rows.append([cities[i % len(cities)] for i in range(4)])
+    return np.array(rows, dtype=object)
 
 def fetch_accounts() -> List[Dict]:
     sql = """
@@ -51,37 +47,14 @@ def fetch_accounts() -> List[Dict]:
         cur.execute(sql)
         return cur.fetchall()
 
-def insert_transactions(rows):
+def insert_transactions(rows, final=()):
     """
     rows: (account_id, txn_time, txn_type, amount, counterparty_account, channel, location)
-    Cast NumPy types -> native Python so mysql-connector is happy.
+    as native Python values; written as multi-row INSERTs, `final` commits with the last batch.
     """
-    def norm(row):
-        acc_id, when, ttype, amt, cpa, channel, location = row
-        return (
-            int(acc_id),
-            when,                         # datetime OK
-            str(ttype),
-            float(amt),
-            (int(cpa) if cpa is not None else None),
-            str(channel),
-            str(location),
-        )
-
-    clean_rows = [norm(r) for r in rows]
-
-    sql = """INSERT INTO Transaction
-             (account_id, txn_time, txn_type, amount, counterparty_account, channel, location)
-             VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.executemany(sql, clean_rows)
-
-def update_balances(balance_deltas: Dict[int, float]):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        for acc_id, delta in balance_deltas.items():
-            cur.execute("UPDATE Account SET balance = balance + %s WHERE account_id=%s", (delta, acc_id))
+    bulk_insert("Transaction",
+                ["account_id", "txn_time", "txn_type", "amount", "counterparty_account", "channel", "location"],
+                rows, final=final, report=None)
 
 def sprinkle_loans():
     """Make loan stats more interesting: approve some, reject some, disburse a few."""
@@ -94,66 +67,101 @@ def sprinkle_loans():
         # from remaining approved, disburse ~50%
         cur.execute("UPDATE Loan SET status='DISBURSED' WHERE status='APPROVED' AND RAND() < 0.5")
 
-def generate():
+def draw_chunk(rng, m, ids, weights, balance, cities, now):
+    """
+    Draw m events at once. Returns the Transaction rows (as native values) and
+    the per-account balance delta (indexed like `ids` / `balance`).
+
+    Withdrawals and transfers are capped at the account's balance at the start
+    of the chunk (floor 100), so a chunk never needs a row-by-row running balance.
+    """
+    import numpy as np
+    n_acc = len(balance)
+
+    # pick primary accounts (larger balances weighted slightly higher)
+    src = rng.choice(n_acc, size=m, p=weights)
+    kind = rng.choice(3, size=m, p=[0.40, 0.35, 0.25])  # 0 DEPOSIT, 1 WITHDRAW, 2 TRANSFER
+
+    # skewed amounts around a few thousand to tens of thousands
+    amt = np.maximum(100.0, rng.lognormal(mean=8.5, sigma=0.7, size=m))
+    # fraudify ~FRAUD_RATE: very large spikes (70%) or odd micro-splits (30%)
+    fraud = rng.random(m) < FRAUD_RATE
+    spike = rng.random(m) < 0.7
+    amt = np.where(fraud & spike, amt * rng.uniform(8, 20, size=m), amt)
+    amt = np.where(fraud & ~spike, rng.choice([199.0, 299.0, 499.0, 999.0], size=m), amt)
+    outgoing = kind != 0
+    amt = np.where(outgoing, np.minimum(amt, np.maximum(100.0, balance[src])), amt)
+    amt = np.round(amt, 2)
+
+    # bias a bit toward recent days; whole minutes back from now, random second
+    minutes_back = ((rng.beta(2, 6, size=m) * DAYS_BACK).astype(np.int64) * 1440
+                    + rng.integers(0, 24, size=m) * 60 + rng.integers(0, 60, size=m))
+    when = (np.datetime64(now.replace(second=0, microsecond=0), "s")
+            - minutes_back.astype("timedelta64[m]") + rng.integers(0, 60, size=m).astype("timedelta64[s]"))
+
+    channel = np.array(CHANNELS, dtype=object)[rng.integers(0, len(CHANNELS), size=m)]
+    location = cities[src, rng.integers(0, 4, size=m)]
+
+    # transfer counterparties: any other account
+    dst = rng.integers(0, max(n_acc - 1, 1), size=m)
+    dst = dst + (dst >= src) if n_acc > 1 else src
+    transfer = (kind == 2) & (dst != src)
+    kind = np.where((kind == 2) & ~transfer, 1, kind)  # single account: a transfer degrades to a withdrawal
+
+    signed = np.where(kind == 0, amt, -amt)
+    delta = np.bincount(src, weights=signed, minlength=n_acc)
+    delta += np.bincount(dst[transfer], weights=amt[transfer], minlength=n_acc)
+
+    types = np.array(["DEPOSIT", "WITHDRAW", "TRANSFER_OUT"], dtype=object)[kind]
+    counterparty = ids[dst].astype(object)
+    counterparty[~transfer] = None
+    rows = list(zip(ids[src].tolist(), when.tolist(), types.tolist(), amt.tolist(), counterparty.tolist(),
+                    channel.tolist(), location.tolist()))
+    t = np.flatnonzero(transfer)
+    rows += zip(ids[dst[t]].tolist(), when[t].tolist(), ["TRANSFER_IN"] * len(t), amt[t].tolist(),
+                ids[src[t]].tolist(), channel[t].tolist(), cities[dst[t], rng.integers(0, 4, size=len(t))].tolist())
+    return rows, delta
+
+def generate(n_txns=N_TXNS, chunk=CHUNK_EVENTS):
+    """
+    Insert ~n_txns synthetic events (transfers create 2 rows), chunk events at a time.
+
+    Every draw comes from one np.random.default_rng(SEED), so the same accounts,
+    n_txns and chunk always produce the same data. Each chunk is written as
+    multi-row INSERTs and its balance changes as a single UPDATE committed with
+    the chunk's last batch.
+    """
+    import numpy as np  # loaded only when data is actually generated
+    rng = np.random.default_rng(SEED)
+
     accts = fetch_accounts()
+    if not accts:
+        print("No active accounts; nothing to generate.")
+        return
     if len(accts) < 2:
         print("Need at least 2 active accounts to generate transfers. Add more accounts if possible.")
-    acct_ids = [a["account_id"] for a in accts]
-    by_id = {a["account_id"]: a for a in accts}
-    rows = []
-    bal_delta = {}  # track net balance change per account
-
-    for i in range(N_TXNS):
-        # pick a primary account (weight larger balances slightly higher)
-        weights = np.array([max(1.0, math.log1p(a["balance"])) for a in accts], dtype=float)
-        weights /= weights.sum()
-        acc = np.random.choice(accts, p=weights)
-
-        # choose type (transfers create 2 rows)
-        txn_type = np.random.choice(["DEPOSIT","WITHDRAW","TRANSFER"], p=[0.40, 0.35, 0.25])
-
-        # set base amount
-        amt = _lognormal_amount()
-
-        # fraudify ~FRAUD_RATE: make amount extreme or odd channel combos
-        is_fraud_like = (np.random.rand() < FRAUD_RATE)
-        if is_fraud_like:
-            # spike amount (very large withdrawal/transfer) or odd micro-transactions
-            if np.random.rand() < 0.7:
-                amt *= np.random.uniform(8, 20)   # very large
-            else:
-                amt = np.random.choice([199, 299, 499, 999])  # odd splits
-
-        when = _random_time_within(DAYS_BACK)
-        channel = random.choice(CHANNELS)
-        location = _choose_location(acc.get("region"))
-
-        if txn_type == "DEPOSIT":
-            rows.append((int(acc["account_id"]), when, "DEPOSIT", float(round(amt, 2)),None, channel, location))
-            bal_delta[acc["account_id"]] = bal_delta.get(acc["account_id"], 0.0) + amt
-
-        elif txn_type == "WITHDRAW":
-            # keep within balance to avoid negatives (demo)
-            amt = min(amt, max(100.0, float(by_id[acc["account_id"]]["balance"]) + bal_delta.get(acc["account_id"], 0.0)))
-            rows.append((int(acc["account_id"]), when, "WITHDRAW", float(round(amt, 2)),None, channel, location))
-            bal_delta[acc["account_id"]] = bal_delta.get(acc["account_id"], 0.0) - amt
-
-        else:  # TRANSFER
-            # pick a different account
-            dst = acc["account_id"]
-            while dst == acc["account_id"] and len(acct_ids) > 1:
-                dst = random.choice(acct_ids)
-            # keep within balance
-            amt = min(amt, max(100.0, float(by_id[acc["account_id"]]["balance"]) + bal_delta.get(acc["account_id"], 0.0)))
-            rows.append((int(acc["account_id"]), when, "TRANSFER_OUT", float(round(amt, 2)),int(dst), channel, location))
-            rows.append((int(dst), when, "TRANSFER_IN", float(round(amt, 2)),int(acc["account_id"]), channel, _choose_location(by_id[int(dst)].get("region"))))
-            bal_delta[acc["account_id"]] = bal_delta.get(acc["account_id"], 0.0) - amt
-            bal_delta[dst] = bal_delta.get(dst, 0.0) + amt
-
-    insert_transactions(rows)
-    update_balances(bal_delta)
+    ids = np.array([a["account_id"] for a in accts], dtype=np.int64)
+    balance = np.array([float(a["balance"]) for a in accts])
+    cities = _city_table([a.get("region") for a in accts])
+    weights = np.maximum(1.0, np.log1p(np.maximum(balance, 0.0)))  # built once, not per event
+    weights /= weights.sum()
+    now = datetime.now()
+
+    t0 = time.perf_counter()
+    total_rows, touched = 0, set()
+    for start in range(0, n_txns, chunk):
+        rows, delta = draw_chunk(rng, min(chunk, n_txns - start), ids, weights, balance, cities, now)
+        changed = np.flatnonzero(delta)
+        deltas = dict(zip(ids[changed].tolist(), np.round(delta[changed], 2).tolist()))
+        insert_transactions(rows, final=[balance_update(deltas)] if deltas else ())
+        balance += delta
+        total_rows += len(rows)
+        touched.update(deltas)
+        print(f"  {min(start + chunk, n_txns):,}/{n_txns:,} events, {total_rows:,} rows "
+              f"({total_rows / (time.perf_counter() - t0):,.0f} rows/s)")
+
     sprinkle_loans()
-    print(f"Inserted {len(rows)} transaction rows (~{N_TXNS} events). Updated balances for {len(bal_delta)} accounts.")
+    print(f"Inserted {total_rows} transaction rows (~{n_txns} events). Updated balances for {len(touched)} accounts.")
 
 def score_new():
     # run the existing model to fill FraudScore
@@ -163,6 +171,7 @@ def score_new():
 
 def generate_loans(n=100):
     """Insert n synthetic loan applications across all customers/regions."""
+    random.seed(SEED)
     # Fetch all customers
     with get_conn() as conn:
         cur = conn.cursor(dictionary=True)
@@ -193,7 +202,13 @@ def generate_loans(n=100):
     print(f"✓ Inserted {len(rows)} synthetic loans for {len(customers)} customers across regions.")
 
 def main():
-    generate()
+    ap = argparse.ArgumentParser(description="Insert dummy transactions and loans, then score the new transactions.")
+    ap.add_argument("--txns", type=int, default=N_TXNS,
+                    help="Events to generate (transfers create 2 rows).")
+    ap.add_argument("--chunk", type=int, default=CHUNK_EVENTS,
+                    help="Events drawn, inserted and committed per chunk.")
+    args = ap.parse_args()
+    generate(args.txns, args.chunk)
     score_new()
     generate_loans(180)
     print("Done.")
@@ -0,0 +1,90 @@
+# scripts/migrate.py
+"""
+Apply the versioned schema migrations in db/migrations/ (NNN_description.sql)
+that the database has not seen yet, in version order.
+
+Applied versions are recorded in SchemaMigration. Statements go through
+app.db, so the same files run on MySQL and on the SQLite backend. Tables
+are created with IF NOT EXISTS and an ALTER TABLE ... ADD COLUMN is skipped
+when the column is already there, so a database created from the current
+schema files can apply every migration too.
+
+Usage:
+  python -m scripts.migrate            # apply pending migrations
+  python -m scripts.migrate --status   # list applied / pending, change nothing
+"""
+import argparse
+import re
+from pathlib import Path
+
+from app.db import get_conn
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "db" / "migrations"
+_ADD_COLUMN = re.compile(r"ALTER\s+TABLE\s+(\w+)\s+ADD\s+COLUMN\s+(\w+)", re.I)
+
+TRACKING_SQL = """
+    CREATE TABLE IF NOT EXISTS SchemaMigration(
+      version INT PRIMARY KEY,
+      name VARCHAR(100) NOT NULL,
+      applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+def available():
+    """[(version, name, path)] for every migration file, by version."""
+    found = []
+    for path in MIGRATIONS_DIR.glob("*.sql"):
+        m = re.match(r"(\d+)_(\w+)\.sql$", path.name)
+        if m:
+            found.append((int(m.group(1)), m.group(2), path))
+    return sorted(found)
+
+def statements(path):
+    sql = "\n".join(line for line in path.read_text().splitlines() if not line.strip().startswith("--"))
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+def has_column(cur, table, column):
+    cur.execute(f"SELECT * FROM {table} LIMIT 0")
+    cur.fetchall()
+    return column.lower() in (d[0].lower() for d in cur.description)
+
+def applied(cur):
+    cur.execute(TRACKING_SQL)
+    cur.execute("SELECT version FROM SchemaMigration")
+    return {int(v) for (v,) in cur.fetchall()}
+
+def migrate(dry_run=False):
+    """Apply pending migrations; returns the versions applied (or pending, with dry_run)."""
+    done = []
+    with get_conn() as conn:
+        cur = conn.cursor()
+        seen = applied(cur)
+        for version, name, path in available():
+            if version in seen:
+                continue
+            if not dry_run:
+                # DDL commits implicitly on MySQL, so a migration is recorded right after it succeeds
+                for stmt in statements(path):
+                    m = _ADD_COLUMN.match(stmt)
+                    if m and has_column(cur, *m.groups()):
+                        continue
+                    cur.execute(stmt)
+                cur.execute("INSERT INTO SchemaMigration (version, name) VALUES (%s, %s)", (version, name))
+                print(f"✓ applied {path.name}")
+            done.append(version)
+    return done
+
+def main():
+    ap = argparse.ArgumentParser(description="Apply pending schema migrations from db/migrations/.")
+    ap.add_argument("--status", action="store_true", help="Only list applied and pending migrations.")
+    args = ap.parse_args()
+    if args.status:
+        pending = set(migrate(dry_run=True))
+        for version, name, _ in available():
+            print(f"{version:03d} {name:<40} {'pending' if version in pending else 'applied'}")
+        return
+    done = migrate()
+    print(f"{len(done)} migration(s) applied." if done else "Schema is up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from app.account_stats import AccountStatsStore
+from app.fraud_model import featurize
+from app.transfer_graph import TransferGraph
+from app.velocity import VelocityStore
+
+T0 = datetime(2024, 6, 1, 12, 0, 0)
+
+def _rows(*rows):
+    """(txn_id, account_id, amount, txn_type, counterparty_account) -> a scoring batch."""
+    return pd.DataFrame([{"txn_id": t, "account_id": a, "amount": amt, "channel": "ONLINE", "location": "Local",
+                          "txn_time": T0 + timedelta(minutes=t), "txn_type": kind,
+                          "counterparty_account": cp, "customer_id": a, "region": "North"}
+                         for t, a, amt, kind, cp in rows])
+
+def test_late_row_is_folded_once_and_replays_are_not():
+    stats = AccountStatsStore(snapshot={1: [0, 0.0, 0.0, 0], 2: [0, 0.0, 0.0, 0]})
+    windows, graph = VelocityStore(), TransferGraph()
+    featurize(_rows((1, 1, 100.0, "DEPOSIT", None), (3, 1, 50.0, "TRANSFER_OUT", 2)),
+              stats=stats, windows=windows, graph=graph)
+    # txn 2 committed late, below txn 3 already folded; txn 3 is replayed alongside it
+    featurize(_rows((2, 1, 70.0, "TRANSFER_OUT", 2), (3, 1, 50.0, "TRANSFER_OUT", 2)),
+              stats=stats, windows=windows, graph=graph)
+    n, mean, _, last = stats.snapshot([1])[1]
+    assert (n, mean, last) == (3, (100.0 + 70.0 + 50.0) / 3, 3)
+    assert windows.window(1).aggregates()[2:4] == (3, 220.0)
+    assert graph.account_features(1)[4] == 120.0  # out amount: both transfers, the replay not twice
+    featurize(_rows((2, 1, 70.0, "TRANSFER_OUT", 2)), stats=stats, windows=windows, graph=graph)
+    assert stats.snapshot([1])[1][0] == 3
+    assert windows.window(1).aggregates()[2] == 3
+    assert graph.account_features(1)[4] == 120.0
@@ -0,0 +1,17 @@
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from app.preauth import CompiledForest
+
+
+def test_compiled_forest_matches_sklearn():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, 6)).astype(np.float32)
+    X[:20] *= 8  # a few outliers, so some paths end early
+    for max_features in (1.0, 0.5):
+        clf = IsolationForest(n_estimators=50, max_features=max_features, random_state=0).fit(X)
+        forest = CompiledForest(clf)
+        rows = np.vstack([X[:200], rng.normal(scale=3, size=(50, 6)).astype(np.float32)])
+        expected = -clf.decision_function(rows)
+        got = np.array([forest.raw_score(x) for x in rows])
+        np.testing.assert_allclose(got, expected, rtol=1e-9, atol=1e-12)